@@ -0,0 +1,85 @@
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings determinísticos derivados do hash do texto, sem chamadas à OpenAI"""
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model_name = f"fake-{dimensions}"
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        return np.random.default_rng(seed).standard_normal(self.dimensions, dtype=np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+class _FakeCompletions:
+    def __init__(self, response: str):
+        self.response = response
+        self.calls = 0
+
+    async def create(self, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        self.calls += 1
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.response))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens)
+        )
+
+class FakeGroq:
+    """Cliente com a mesma interface de chat.completions.create do AsyncGroq"""
+    def __init__(self, response: str = "Resposta gerada pelo modelo falso."):
+        self.chat = SimpleNamespace(completions=_FakeCompletions(response))
+
+class _FakeQuery:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+
+    def select(self, *args: Any, **kwargs: Any) -> "_FakeQuery":
+        return self
+
+    def eq(self, column: str, value: Any) -> "_FakeQuery":
+        return _FakeQuery([row for row in self.rows if row.get(column, value) == value])
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+class FakeSupabase:
+    """Cliente Supabase em memória: table(nome) devolve as linhas registradas"""
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.tables = tables or {}
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self.tables.get(name, []))
+
+def bot_row(bot_id: str, behaviors: int, patterns_per_behavior: int) -> Dict[str, Any]:
+    """Linha de bot com prompts comportamentais, padrões e prioridades sintéticos"""
+    return {
+        'id': bot_id,
+        'main_prompt': "Você é um assistente de atendimento. Responda com base no contexto fornecido.",
+        'updated_at': '2024-01-01T00:00:00',
+        'behavioral_prompts': [
+            {
+                'behavior_type': f"BEHAVIOR_{b}",
+                'prompt': f"Comportamento {b}: mantenha o tom adequado ao assunto {b}.",
+                'patterns': [f"assunto{b}x{p}" for p in range(patterns_per_behavior)],
+                'priority': b % 5,
+                'examples': [],
+                'updated_at': '2024-01-01T00:00:00'
+            }
+            for b in range(behaviors)
+        ]
+    }
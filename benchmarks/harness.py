@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import platform
+import statistics
+import subprocess
+from typing import Any, Callable, Dict, List, Optional
+
+def measure(name: str,
+            fn: Callable[[Any], Any],
+            number: int,
+            repeat: int = 5,
+            setup: Optional[Callable[[], Any]] = None,
+            params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Executa fn(estado) `number` vezes por rodada e retorna o tempo por operação em microssegundos
+
+    setup (fora da medição) prepara o estado de cada rodada, para medir operações
+    que consomem o estado, como a construção de um índice.
+    """
+    fn(setup() if setup else None)  # Aquecimento
+
+    samples: List[float] = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(state)
+        samples.append((time.perf_counter() - start) / number * 1e6)
+
+    return {
+        'name': name,
+        'params': params or {},
+        'number': number,
+        'repeat': repeat,
+        'mean_us': round(statistics.mean(samples), 3),
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'max_us': round(max(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def environment() -> Dict[str, Any]:
+    """Metadados da execução, para comparar resultados ao longo do tempo"""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count()
+    }
+
+def summary_line(result: Dict[str, Any]) -> str:
+    params = ' '.join(f"{key}={value}" for key, value in result['params'].items())
+    return f"{result['name']:<40} {params:<28} median {result['median_us']:>12.2f} us  min {result['min_us']:>12.2f} us"
@@ -0,0 +1,243 @@
+"""Microbenchmarks dos componentes quentes, executados offline com backends falsos
+
+Uso: python -m benchmarks.run [--quick] [--only suite1,suite2] [--output resultados.json]
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from typing import Any, Callable, Dict, List
+import numpy as np
+
+# Importa services antes de prompt_middleware (services.chat_service importa o middleware)
+import services  # noqa: F401
+import services.supabase_pool as supabase_pool
+from langchain.schema import Document
+from services.vector_store import NumpyVectorIndex
+from services.completion_cache import completion_cache
+from services.llm_service import get_groq_response
+from prompt_middleware import (
+    BehaviorClassifier, CompiledBehaviorMatcher, ConversationContext, Interaction,
+    PromptMiddleware, SupabasePromptStore
+)
+from supabase_rag import ProjectTask
+from benchmarks.fakes import FakeEmbeddings, FakeGroq, FakeSupabase, bot_row
+from benchmarks.harness import environment, measure, summary_line
+
+def _behavior_config(behaviors: int, patterns: int):
+    row = bot_row('bench-bot', behaviors, patterns)['behavioral_prompts']
+    return (
+        {item['behavior_type']: item['prompt'] for item in row},
+        {item['behavior_type']: item['patterns'] for item in row},
+        {item['behavior_type']: item['priority'] for item in row}
+    )
+
+def bench_behavior_classifier(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    results = []
+    filler = "olá, bom dia, eu gostaria de entender melhor como funciona o atendimento de vocês"
+    for behaviors, patterns in ([(10, 20), (50, 40)] if quick else [(10, 20), (50, 40), (200, 50)]):
+        prompts, behavior_patterns, priorities = _behavior_config(behaviors, patterns)
+        params = {'behaviors': behaviors, 'patterns': behaviors * patterns}
+
+        results.append(measure(
+            'behavior_classifier.compile',
+            lambda _: CompiledBehaviorMatcher(behavior_patterns, priorities),
+            number=1, repeat=5, params=params
+        ))
+
+        classifier = BehaviorClassifier()
+        classifier.update_patterns(prompts, behavior_patterns, priorities)
+        messages = itertools.cycle([
+            f"{filler} sobre assunto{behaviors - 1}x{patterns - 1}",  # Último padrão registrado
+            f"{filler} e o horário de funcionamento amanhã",  # Sem correspondência
+            f"assunto0x0 {filler}"
+        ])
+        results.append(measure(
+            'behavior_classifier.classify',
+            lambda _: classifier.classify(next(messages)),
+            number=2000, repeat=5, params=params
+        ))
+    return results
+
+def _board(items: int) -> Dict[str, str]:
+    projects = [
+        {'id': p, 'name': f"Projeto {p}", 'description': "Descrição do projeto " * 5,
+         'status': ['planejado', 'em andamento', 'concluído'][p % 3], 'priority': ['alta', 'média', 'baixa'][p % 3],
+         'deadline': f"2025-{p % 12 + 1:02d}-15"}
+        for p in range(max(1, items // 10))
+    ]
+    tasks = [
+        {'id': 1000 + t, 'project_id': t % len(projects), 'title': f"Tarefa {t}", 'description': "Detalhes da tarefa " * 8,
+         'status': ['pendente', 'em andamento', 'concluída'][t % 3], 'priority': ['alta', 'média', 'baixa'][t % 3],
+         'due_date': f"2024-{t % 12 + 1:02d}-{t % 28 + 1:02d}", 'assigned_to': f"Pessoa {t % 17}"}
+        for t in range(items)
+    ]
+    return {'projects_data': json.dumps(projects, ensure_ascii=False), 'tasks_data': json.dumps(tasks, ensure_ascii=False)}
+
+def bench_create_documents(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    results = []
+    # Só a conversão em documentos: a sessão não é configurada (sem embeddings nem índice)
+    task = object.__new__(ProjectTask)
+    for items in ([100, 1000] if quick else [100, 1000, 10000]):
+        board = _board(items)
+        results.append(measure(
+            'project_task.create_documents',
+            lambda _: task.create_documents(board['projects_data'], board['tasks_data']),
+            number=max(1, 2000 // items), repeat=5,
+            params={'tasks': items, 'bytes': len(board['projects_data']) + len(board['tasks_data'])}
+        ))
+    return results
+
+def bench_prompt_middleware(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    results = []
+    rag_context = "\n".join(f"Trecho {i}: " + "conteúdo relevante do documento " * 30 for i in range(8))
+    original = supabase_pool.get_supabase_client
+    try:
+        for behaviors, patterns in ([(10, 20)] if quick else [(10, 20), (50, 40)]):
+            client = FakeSupabase({'bots': [bot_row('bench-bot', behaviors, patterns)]})
+            supabase_pool.get_supabase_client = lambda: client
+            SupabasePromptStore.invalidate()
+            middleware = PromptMiddleware('bench-bot')
+            queries = itertools.cycle([
+                "Quais são as condições de pagamento disponíveis?",
+                f"Tenho uma dúvida sobre assunto{behaviors - 1}x0",
+            ])
+            params = {'behaviors': behaviors, 'context_chars': len(rag_context)}
+            results.append(measure(
+                'prompt_middleware.build_messages',
+                lambda _: middleware.build_messages(next(queries), rag_context),
+                number=2000, repeat=5, params=params
+            ))
+            results.append(measure(
+                'prompt_middleware.process_query',
+                lambda _: middleware.process_query(next(queries), rag_context),
+                number=2000, repeat=5, params=params
+            ))
+    finally:
+        supabase_pool.get_supabase_client = original
+        SupabasePromptStore.invalidate()
+    return results
+
+def bench_vector_index(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    results = []
+    embeddings = FakeEmbeddings(dimensions)
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((16, dimensions), dtype=np.float32)
+    for size in ([1000, 5000] if quick else [1000, 10000, 50000]):
+        vectors = rng.standard_normal((size, dimensions), dtype=np.float32)
+        documents = [Document(page_content=f"chunk {i}", metadata={'project_id': i % 100}) for i in range(size)]
+        ids = [str(i) for i in range(size)]
+        params = {'size': size, 'dimensions': dimensions}
+
+        results.append(measure(
+            'vector_index.build',
+            lambda _: NumpyVectorIndex(embeddings).add_vectors(vectors, documents, ids=ids),
+            number=1, repeat=3, params=params
+        ))
+
+        index = NumpyVectorIndex(embeddings)
+        index.add_vectors(vectors, documents, ids=ids)
+        single = itertools.cycle(queries.tolist())
+        searches = max(10, 200000 // size)
+        results.append(measure(
+            'vector_index.search',
+            lambda _: index.similarity_search_with_score_by_vector(next(single), k=8),
+            number=searches, repeat=5, params=params
+        ))
+        results.append(measure(
+            'vector_index.search_filtered',
+            lambda _: index.similarity_search_with_score_by_vector(next(single), k=8, filter={'project_id': 7}),
+            number=searches, repeat=5, params={**params, 'selectivity': 0.01}
+        ))
+        batch = queries.tolist()
+        results.append(measure(
+            'vector_index.batch_search',
+            lambda _: index.batch_similarity_search_with_score_by_vectors(batch, k=8),
+            number=max(1, searches // 16), repeat=5, params={**params, 'queries': len(batch)}
+        ))
+    return results
+
+def bench_conversation_context(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    results = []
+    interaction = Interaction(message="Qual o prazo de entrega?", behavior="GENERAL", timestamp=time.time())
+    for max_history in ([5, 100] if quick else [5, 100, 1000]):
+        context = ConversationContext(max_history=max_history)
+        for _ in range(max_history):
+            context.add_interaction(interaction)
+        params = {'max_history': max_history}
+        results.append(measure(
+            'conversation_context.add_interaction',
+            lambda _: context.add_interaction(interaction),
+            number=20000, repeat=5, params=params
+        ))
+        results.append(measure(
+            'conversation_context.get_recent_behaviors',
+            lambda _: context.get_recent_behaviors(3),
+            number=20000, repeat=5, params=params
+        ))
+    return results
+
+def bench_llm(quick: bool, dimensions: int) -> List[Dict[str, Any]]:
+    """Custo local de get_groq_response (chave do cache e métricas) com o cliente Groq falso"""
+    results = []
+    client = FakeGroq()
+    loop = asyncio.new_event_loop()
+    messages = [
+        {"role": "system", "content": "Você é um assistente. " * 50},
+        {"role": "user", "content": "Contexto:\n" + "conteúdo relevante " * 400},
+        {"role": "user", "content": "Pergunta do Cliente: Qual o prazo?"}
+    ]
+    enabled = completion_cache.enabled
+    try:
+        for cached in (False, True):
+            completion_cache.enabled = cached
+            results.append(measure(
+                'llm.get_groq_response',
+                lambda _: loop.run_until_complete(get_groq_response(client, messages)),
+                number=1000, repeat=5, params={'completion_cache': 'hit' if cached else 'off'}
+            ))
+    finally:
+        completion_cache.enabled = enabled
+        loop.close()
+    return results
+
+SUITES: Dict[str, Callable[[bool, int], List[Dict[str, Any]]]] = {
+    'behavior_classifier': bench_behavior_classifier,
+    'create_documents': bench_create_documents,
+    'prompt_middleware': bench_prompt_middleware,
+    'vector_index': bench_vector_index,
+    'conversation_context': bench_conversation_context,
+    'llm': bench_llm,
+}
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos componentes da API")
+    parser.add_argument('--quick', action='store_true', help="Tamanhos menores, para uma verificação rápida")
+    parser.add_argument('--only', help=f"Suítes separadas por vírgula ({', '.join(SUITES)})")
+    parser.add_argument('--dimensions', type=int, default=384, help="Dimensão dos embeddings falsos")
+    parser.add_argument('--output', help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    selected = args.only.split(',') if args.only else list(SUITES)
+    unknown = [name for name in selected if name not in SUITES]
+    if unknown:
+        parser.error(f"Suítes desconhecidas: {', '.join(unknown)}")
+
+    results = []
+    for name in selected:
+        for result in SUITES[name](args.quick, args.dimensions):
+            print(summary_line(result), file=sys.stderr)
+            results.append(result)
+
+    report = json.dumps({'environment': environment(), 'quick': args.quick, 'results': results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+import re
 from dataclasses import dataclass
 from datetime import datetime
 import json
 from enum import Enum, auto
 from dotenv import load_dotenv
 from openai import OpenAI
-from supabase import create_client, Client
+from supabase import Client
+from services.supabase_pool import get_supabase_client
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -40,6 +42,9 @@ class BotConfig:
     user_id: str
     main_prompt: Optional[str] = None
     behavioral_prompts: Optional[Dict[str, str]] = None
+    behavior_patterns: Optional[Dict[str, List[str]]] = None
+    behavior_priorities: Optional[Dict[str, int]] = None
+    behavior_examples: Optional[Dict[str, List[str]]] = None
 
 class PromptGenerator:
     """Gera prompts usando OpenAI"""
@@ -67,12 +72,13 @@ com base na descrição fornecida. O prompt deve ser claro, específico e seguir
         
         return response.choices[0].message.content.strip()
     
-    def generate_behavioral_prompts(self, description: str, main_prompt: str) -> Dict[str, str]:
-        """Gera sub-prompts comportamentais"""
+    def generate_behaviors(self, description: str, main_prompt: str) -> Dict[str, Dict[str, Any]]:
+        """Gera, para cada comportamento, o sub-prompt, os padrões de disparo, a prioridade e exemplos de mensagens"""
         system_prompt = """Você é um especialista em criar prompts comportamentais para chatbots. 
 Para cada comportamento listado, crie um sub-prompt específico que oriente como o bot deve responder 
 naquela situação específica. Os prompts devem ser claros, práticos e alinhados com a personalidade 
-principal do bot."""
+principal do bot. Para cada comportamento, informe também como reconhecer as mensagens do cliente 
+que pertencem a ele."""
         
         behaviors_description = "\n".join([
             f"- {behavior.name}: {behavior.value}" 
@@ -87,10 +93,20 @@ Prompt Principal: {main_prompt}
 Crie sub-prompts para cada um dos seguintes comportamentos:
 {behaviors_description}
 
-Para cada comportamento, forneça um prompt que explique como o bot deve responder naquela situação específica.
+Para cada comportamento, forneça:
+- "prompt": como o bot deve responder naquela situação específica
+- "patterns": de 5 a 15 palavras-chave ou expressões regulares (sintaxe do Python, em minúsculas) que indicam o comportamento na mensagem do cliente; prefira radicais como "reembols" ou "parcel\\w*"
+- "priority": inteiro de 0 a 10; comportamentos mais específicos (ex.: CANCELLATION, PAYMENT) devem ter prioridade maior que os genéricos (ex.: GREETING), que vencem quando vários casam
+- "examples": de 3 a 5 mensagens típicas de clientes nessa situação
+O comportamento GENERAL é o padrão quando nada casa: deixe "patterns" e "examples" vazios.
 Retorne no formato JSON:
 {{
-    "BEHAVIOR_TYPE": "prompt text",
+    "BEHAVIOR_TYPE": {{
+        "prompt": "prompt text",
+        "patterns": ["palavra-chave", "expressão regular"],
+        "priority": 5,
+        "examples": ["mensagem de exemplo"]
+    }},
     ...
 }}"""
         
@@ -105,15 +121,51 @@ Retorne no formato JSON:
             temperature=0.7
         )
         
-        return json.loads(response.choices[0].message.content)
+        return self.parse_behaviors(json.loads(response.choices[0].message.content))
+    
+    @staticmethod
+    def parse_behaviors(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Normaliza a resposta do modelo (aceita também o formato antigo, só com o texto do prompt)"""
+        behaviors = {}
+        for behavior, value in data.items():
+            if isinstance(value, str):
+                value = {'prompt': value}
+            
+            # As mensagens são comparadas em minúsculas; padrões inválidos são descartados
+            patterns = []
+            for pattern in value.get('patterns') or []:
+                pattern = str(pattern).strip().lower()
+                try:
+                    re.compile(pattern)
+                except re.error:
+                    continue
+                if pattern and pattern not in patterns:
+                    patterns.append(pattern)
+            
+            try:
+                priority = int(value.get('priority') or 0)
+            except (TypeError, ValueError):
+                priority = 0
+            
+            behaviors[behavior] = {
+                'prompt': value.get('prompt', ''),
+                'patterns': patterns,
+                'priority': priority,
+                'examples': [str(example).strip() for example in value.get('examples') or [] if str(example).strip()]
+            }
+        return behaviors
+    
+    def generate_behavioral_prompts(self, description: str, main_prompt: str) -> Dict[str, str]:
+        """Gera sub-prompts comportamentais"""
+        return {
+            behavior: details['prompt']
+            for behavior, details in self.generate_behaviors(description, main_prompt).items()
+        }
 
 class SupabaseManager:
     """Gerencia operações no Supabase"""
     def __init__(self):
-        self.client: Client = create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_KEY')
-        )
+        self.client: Client = get_supabase_client()
     
     def save_bot(self, config: BotConfig) -> str:
         """Salva o bot e seus prompts no Supabase"""
@@ -135,7 +187,10 @@ class SupabaseManager:
                 {
                     'bot_id': bot_id,
                     'behavior_type': behavior,
-                    'prompt': prompt
+                    'prompt': prompt,
+                    'patterns': (config.behavior_patterns or {}).get(behavior, []),
+                    'priority': (config.behavior_priorities or {}).get(behavior, 0),
+                    'examples': (config.behavior_examples or {}).get(behavior, [])
                 }
                 for behavior, prompt in config.behavioral_prompts.items()
             ]
@@ -165,10 +220,16 @@ class BotCreator:
         
         # Gera os prompts comportamentais
         print("Gerando prompts comportamentais...")
-        config.behavioral_prompts = self.prompt_generator.generate_behavioral_prompts(
+        behaviors = self.prompt_generator.generate_behaviors(
             description,
             config.main_prompt
         )
+        config.behavioral_prompts = {behavior: details['prompt'] for behavior, details in behaviors.items()}
+        
+        # Padrões (classificação por regex) e exemplos (classificação por embeddings)
+        config.behavior_patterns = {behavior: details['patterns'] for behavior, details in behaviors.items()}
+        config.behavior_priorities = {behavior: details['priority'] for behavior, details in behaviors.items()}
+        config.behavior_examples = {behavior: details['examples'] for behavior, details in behaviors.items()}
         
         # Salva no Supabase
         print("Salvando bot no Supabase...")
@@ -215,10 +276,7 @@ async def create_bot(request: BotRequest):
         )
         
         # Get bot details from Supabase
-        supabase = create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_KEY')
-        )
+        supabase = get_supabase_client()
         
         # Get bot data
         bot_data = supabase.table('bots') \
@@ -1,48 +1,89 @@
 #!/usr/bin/env python
 import os
-from typing import List, Dict, Optional
+import sys
+from typing import Any, AsyncIterator, List, Dict, Optional
 from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from groq import Groq
-from langchain_openai import OpenAIEmbeddings
-from langchain.schema import Document
-from langchain_community.vectorstores import Qdrant
+from services.embedding_cache import get_embeddings
+from services.document_loader import build_chunk_shard
+from services.llm_service import get_async_groq_client, get_groq_response, stream_groq_response, sse_stream, SSE_HEADERS
+from services.index_registry import index_registry, ShardedVectorStore
+from services.session_store import SessionStore
+from services.context_builder import context_packer
+from services.lexical_index import hybrid_search
+from services.session_warmup import SessionWarmup, SessionNotReady
 from prompt_middleware import PromptMiddleware
-from supabase import create_client, Client
+from supabase import Client
 
 # Models para a API
 class ChatSession:
-    def __init__(self, bot_id: str, processing_ids: List[str]):
+    def __init__(self, bot_id: str, processing_ids: List[str], progress=None):
         self.bot_id = bot_id
         self.processing_ids = processing_ids
+        self.progress = progress
         self.middleware = None
         self.vector_store = None
+        self.embeddings = None
+        self.shards = []
         self.groq_client = None
         self.chat_history: List[Dict[str, str]] = []
         self.setup()
     
     def setup(self):
         """Inicializa os componentes necessários para a sessão"""
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        embeddings = OpenAIEmbeddings(model=os.getenv('EMBEDDING_MODEL_NAME', 'text-embedding-3-small'))
+        self.groq_client = get_async_groq_client()
+        embeddings = self.embeddings = get_embeddings()
         
         # Inicializa o middleware
-        self.middleware = PromptMiddleware(bot_id=self.bot_id)
+        self.middleware = PromptMiddleware(bot_id=self.bot_id, embeddings=embeddings)
         
-        # Carrega e combina todos os documentos
-        all_documents = []
-        for proc_id in self.processing_ids:
-            documents = load_document_chunks(proc_id)
-            all_documents.extend(documents)
+        # Obtém um shard compartilhado por processing_id (construído apenas uma vez);
+        # os shards ausentes são carregados e indexados em paralelo
+        self.shards = index_registry.acquire_many(
+            self.processing_ids,
+            lambda proc_id: lambda: build_chunk_shard(proc_id, embeddings, self.progress)
+        )
         
-        # Configura o vector store com todos os documentos
-        collection_name = f"chat_{self.bot_id}_{'_'.join(self.processing_ids)}"
-        self.vector_store = setup_vector_store(all_documents, embeddings, collection_name)
+        self.vector_store = ShardedVectorStore(self.shards, embeddings)
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Estado serializável da sessão (o índice é referenciado pelos processing_ids)"""
+        return {
+            'bot_id': self.bot_id,
+            'processing_ids': self.processing_ids,
+            'chat_history': self.chat_history
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], progress=None) -> "ChatSession":
+        """Reconstrói a sessão a partir do estado salvo por outro worker"""
+        session = cls(record['bot_id'], record['processing_ids'], progress)
+        session.apply_record(record)
+        return session
+    
+    def apply_record(self, record: Dict[str, Any]):
+        """Substitui o histórico pelo gravado por outro worker"""
+        self.chat_history = list(record.get('chat_history', []))
+    
+    def estimate_size(self) -> int:
+        """Estimativa aproximada da memória da sessão (shards compartilhados são contados à parte)"""
+        return 16 * 1024 + sum(
+            sys.getsizeof(msg['user']) + sys.getsizeof(msg['assistant'])
+            for msg in self.chat_history
+        )
+    
+    def close(self):
+        """Libera os shards compartilhados usados pela sessão"""
+        for shard in self.shards:
+            index_registry.release(shard.key)
+        self.shards = []
 
 class ChatRequest(BaseModel):
     message: str
+    filters: Optional[Dict[str, Any]] = None  # Metadados: campo -> valor ou lista de valores (ex.: processing_id)
 
 class ChatResponse(BaseModel):
     response: str
@@ -64,7 +105,8 @@ app.add_middleware(
 )
 
 # Armazena as sessões ativas
-active_sessions: Dict[str, ChatSession] = {}
+active_sessions = SessionStore(restore=ChatSession.from_record, namespace='groq_rag')
+session_warmup = SessionWarmup(active_sessions)
 
 def load_environment():
     """Load environment variables from .env file"""
@@ -84,80 +126,47 @@ def load_environment():
     if missing_vars:
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-def get_groq_response(client: Groq, prompt: str) -> str:
-    """Get response from Groq model"""
-    completion = client.chat.completions.create(
-        model=os.getenv('GROQ_MODEL_NAME', 'deepseek-r1-distill-llama-70b'),
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.6,
-        max_completion_tokens=1024,
-        top_p=0.95,
-        stream=False,
-        reasoning_format="hidden"
-    )
+async def build_rag_prompt(query: str, session: ChatSession, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """Recupera o contexto (restrito aos metadados dos filtros) e monta o prompt final para a consulta"""
+    async def vector_search(k: int):
+        query_embedding = await session.embeddings.aembed_query(query)
+        return query_embedding, await session.vector_store.asimilarity_search_with_score_by_vector(query_embedding, k=k, filter=filters)
     
-    return completion.choices[0].message.content
-
-def load_document_chunks(processing_id: str) -> List[Document]:
-    """Load document chunks from Supabase"""
-    supabase = create_client(
-        os.getenv('SUPABASE_URL'),
-        os.getenv('SUPABASE_SERVICE_KEY')
-    )
+    def lexical_search(terms: List[str], k: int):
+        return session.vector_store.lexical_search_terms(terms, k, filter=filters)
     
-    response = supabase.table('document_chunks') \
-        .select('chunk_text, chunk_index') \
-        .eq('processing_id', processing_id) \
-        .order('chunk_index') \
-        .execute()
-    
-    if not response.data:
-        raise ValueError(f"Nenhum documento encontrado para o processing_id: {processing_id}")
-    
-    documents = []
-    for chunk in response.data:
-        doc = Document(
-            page_content=chunk['chunk_text'],
-            metadata={
-                'chunk_index': chunk['chunk_index'],
-                'processing_id': processing_id
-            }
-        )
-        documents.append(doc)
-    
-    return documents
-
-def setup_vector_store(documents: List[Document], embeddings, collection_name: str):
-    """Set up the Qdrant vector store with the documents"""
-    return Qdrant.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        location=":memory:" if os.getenv('QDRANT_HOST') == 'localhost' else None,
-        url=f"http://{os.getenv('QDRANT_HOST')}:{os.getenv('QDRANT_PORT')}" if os.getenv('QDRANT_HOST') != 'localhost' else None,
-        api_key=os.getenv('QDRANT_API_KEY'),
-        collection_name=collection_name
+    # Gera o contexto RAG (BM25, vetorial ou híbrido); o embedding da consulta,
+    # quando gerado, também é reutilizado pela classificação de comportamento
+    results, query_embedding, _ = await hybrid_search(
+        query,
+        context_packer.candidates,
+        lexical_search if session.vector_store.has_lexical_index else None,
+        vector_search,
+        context_packer.min_score
     )
-
-def get_rag_response(query: str, session: ChatSession) -> str:
-    """Get RAG-enhanced response for a query"""
-    # Adiciona histórico ao contexto
-    chat_context = "\nHistórico da conversa:\n" + "\n".join([
-        f"Usuário: {msg['user']}\nAssistente: {msg['assistant']}"
-        for msg in session.chat_history[-3:]  # Últimas 3 interações
-    ]) if session.chat_history else ""
     
-    # Gera o contexto RAG
-    results = session.vector_store.similarity_search(query, k=3)
-    rag_context = "\n".join([doc.page_content for doc in results])
+    # Chunks e histórico (últimas 3 interações) dividem o mesmo orçamento de tokens
+    packed = context_packer.pack(results, [
+        f"Usuário: {msg['user']}\nAssistente: {msg['assistant']}"
+        for msg in session.chat_history[-3:]
+    ], min_score=0.0)
+    rag_context = packed.rag_context
+    chat_context = "\nHistórico da conversa:\n" + "\n".join(packed.history) if packed.history else ""
     
     # Combina os contextos
     full_context = f"{rag_context}\n{chat_context}"
     
     # Processa através do middleware
-    final_prompt, behavior = session.middleware.process_query(query, full_context)
+    messages, _ = session.middleware.build_messages(query, full_context, query_embedding)
+    
+    return messages
+
+async def get_rag_response(query: str, session: ChatSession, filters: Optional[Dict[str, Any]] = None) -> str:
+    """Get RAG-enhanced response for a query"""
+    messages = await build_rag_prompt(query, session, filters)
     
     # Obtém a resposta
-    response = get_groq_response(session.groq_client, final_prompt)
+    response = await get_groq_response(session.groq_client, messages)
     
     # Atualiza o histórico
     session.chat_history.append({
@@ -167,40 +176,86 @@ def get_rag_response(query: str, session: ChatSession) -> str:
     
     return response
 
+async def stream_rag_response(query: str, session: ChatSession, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Stream RAG-enhanced response tokens for a query"""
+    messages = await build_rag_prompt(query, session, filters)
+    
+    parts = []
+    async for token in stream_groq_response(session.groq_client, messages):
+        parts.append(token)
+        yield token
+    
+    # O histórico só é atualizado quando o stream termina por completo
+    session.chat_history.append({
+        "user": query,
+        "assistant": "".join(parts)
+    })
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializa as configurações necessárias"""
     load_environment()
 
+async def get_session(session_id: str) -> ChatSession:
+    """Busca a sessão pronta, aguardando a preparação ou reidratando-a do backend compartilhado"""
+    try:
+        session = await session_warmup.get(session_id)
+    except SessionNotReady as e:
+        raise HTTPException(status_code=503, detail=e.progress.to_dict(), headers={"Retry-After": "2"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return session
+
 @app.post("/chat/session")
 async def create_session(config: SessionConfig) -> Dict[str, str]:
     """Cria uma nova sessão de chat"""
     try:
         session_id = f"{config.bot_id}_{'_'.join(config.processing_ids)}"
         if session_id not in active_sessions:
-            active_sessions[session_id] = ChatSession(config.bot_id, config.processing_ids)
+            # A indexação roda em segundo plano; o progresso é consultado em /status
+            await session_warmup.create(session_id, lambda progress: ChatSession(config.bot_id, config.processing_ids, progress=progress))
         return {"session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/chat/{session_id}/status")
+async def session_status(session_id: str) -> Dict[str, Any]:
+    """Informa o progresso da preparação da sessão (chunks carregados, embedados e indexados)"""
+    status = await session_warmup.status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return status
+
 @app.post("/chat/{session_id}")
 async def chat(session_id: str, request: ChatRequest) -> ChatResponse:
     """Processa uma mensagem do chat"""
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    session = await get_session(session_id)
     
     try:
-        session = active_sessions[session_id]
-        response = get_rag_response(request.message, session)
+        response = await get_rag_response(request.message, session, request.filters)
+        await active_sessions.save(session_id, session)
         return ChatResponse(response=response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/{session_id}/stream")
+async def chat_stream(session_id: str, request: ChatRequest) -> StreamingResponse:
+    """Processa uma mensagem do chat enviando os tokens via SSE"""
+    session = await get_session(session_id)
+    
+    tokens = active_sessions.persist_after(session_id, session, stream_rag_response(request.message, session, request.filters))
+    return StreamingResponse(
+        sse_stream(tokens),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @app.delete("/chat/{session_id}")
 async def end_session(session_id: str):
     """Encerra uma sessão de chat"""
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+    await session_warmup.discard(session_id)
     return {"status": "success"}
 
 # Para deploy no Railway
@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
-from routers import bot_router, chat_router
+from routers import bot_router, chat_router, stats_router
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +32,7 @@ app.add_middleware(
 # Include routers
 app.include_router(bot_router, prefix="/bots", tags=["Bots"])
 app.include_router(chat_router, prefix="/chat", tags=["Chat"])
+app.include_router(stats_router, prefix="/stats", tags=["Stats"])
 
 if __name__ == "__main__":
     import uvicorn
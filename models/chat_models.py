@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List, Optional
 
 class ChatRequest(BaseModel):
     message: str
+    filters: Optional[Dict[str, Any]] = None  # Metadados: campo -> valor ou lista de valores (ex.: processing_id)
 
 class ChatResponse(BaseModel):
     response: str
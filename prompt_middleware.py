@@ -1,10 +1,12 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Pattern, Tuple
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import time
+import threading
 import os
+import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
 
 @dataclass
 class Interaction:
@@ -30,112 +32,413 @@ class ConversationContext:
         """Retorna os comportamentos mais recentes"""
         return [i.behavior for i in self.history[-n:]]
 
+def _trie_pattern(words: List[str]) -> str:
+    """Gera uma regex em forma de trie para palavras literais (prefixos compartilhados)"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node: Dict[str, dict]) -> str:
+        is_end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if is_end else group
+    
+    return build(trie)
+
+# Flags inline no início do padrão, que valem para a expressão inteira
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+class CompiledBehaviorMatcher:
+    """Compila os padrões de cada comportamento uma única vez e os avalia por prioridade"""
+    def __init__(self, behavior_patterns: Dict[str, List[str]], priorities: Optional[Dict[str, int]] = None):
+        priorities = priorities or {}
+        
+        # Ordem de preferência: maior prioridade primeiro (empates mantêm a ordem original)
+        self.behaviors = sorted(behavior_patterns, key=lambda behavior: -priorities.get(behavior, 0))
+        self._checks: List[Tuple[str, List[Pattern]]] = []
+        expressions: List[str] = []
+        combined_all = True
+        
+        for behavior in self.behaviors:
+            literals: List[str] = []
+            simple: List[Pattern] = []
+            separate: List[Pattern] = []
+            for pattern in behavior_patterns[behavior]:
+                if not pattern:
+                    continue
+                # Palavras-chave literais vão para uma trie por comportamento
+                if re.escape(pattern) == pattern or re.fullmatch(r'[\w ]+', pattern):
+                    literals.append(pattern)
+                    continue
+                try:
+                    compiled = re.compile(pattern)
+                except re.error:
+                    continue
+                # Grupos de captura (retroreferências numeradas, nomes repetidos) e flags globais
+                # como (?i) mudam de sentido dentro de uma alternância: esses padrões ficam sozinhos
+                (separate if compiled.groups or _GLOBAL_FLAGS.match(pattern) else simple).append(compiled)
+            
+            behavior_expressions = ([_trie_pattern(literals)] if literals else []) + [f"(?:{compiled.pattern})" for compiled in simple]
+            regexes = list(separate)
+            if behavior_expressions:
+                try:
+                    regexes.insert(0, re.compile('|'.join(behavior_expressions)))
+                    expressions.extend(behavior_expressions)
+                except re.error:
+                    regexes[:0] = ([re.compile(behavior_expressions[0])] if literals else []) + simple
+                    combined_all = False
+            if separate:
+                combined_all = False
+            if regexes:
+                self._checks.append((behavior, regexes))
+        
+        # Pré-filtro: uma única busca descarta de uma vez as mensagens sem nenhum padrão
+        self._any: Optional[Pattern] = None
+        if combined_all and expressions:
+            try:
+                self._any = re.compile('|'.join(expressions))
+            except re.error:
+                self._any = None
+    
+    def match(self, message: str) -> Optional[str]:
+        """Retorna o comportamento de maior prioridade com algum padrão presente na mensagem"""
+        if not self._checks or (self._any is not None and self._any.search(message) is None):
+            return None
+        
+        for behavior, regexes in self._checks:
+            if any(regex.search(message) for regex in regexes):
+                return behavior
+        return None
+
 class BehaviorClassifier:
     """Classifica o comportamento com base na mensagem"""
     def __init__(self):
         self.behavior_patterns: Dict[str, List[str]] = {}
+        self.behavior_priorities: Dict[str, int] = {}
         self.default_behavior = "GENERAL"
+        self._matcher: Optional[CompiledBehaviorMatcher] = None
     
-    def update_patterns(self, behaviors: Dict[str, str]):
+    def update_patterns(self, behaviors: Dict[str, str],
+                        patterns: Optional[Dict[str, List[str]]] = None,
+                        priorities: Optional[Dict[str, int]] = None,
+                        matcher: Optional[CompiledBehaviorMatcher] = None):
         """Atualiza os padrões de comportamento baseado nos prompts disponíveis"""
-        # Inicializa o dicionário de padrões vazio
-        self.behavior_patterns = {}
+        patterns = patterns or {}
         
-        # Registra todos os comportamentos do bot
-        for behavior in behaviors.keys():
-            self.behavior_patterns[behavior] = []
+        # Registra todos os comportamentos do bot com seus padrões
+        self.behavior_patterns = {
+            behavior: list(patterns.get(behavior) or [])
+            for behavior in behaviors.keys()
+        }
+        self.behavior_priorities = dict(priorities or {})
+        
+        # Um matcher já compilado (compartilhado entre sessões do bot) evita recompilar
+        self._matcher = matcher
     
     def add_pattern(self, behavior: str, pattern: str):
         """Adiciona um novo padrão para um comportamento"""
         if behavior not in self.behavior_patterns:
             self.behavior_patterns[behavior] = []
         self.behavior_patterns[behavior].append(pattern)
+        self._matcher = None
     
     def classify(self, message: str) -> str:
         """Classifica a mensagem em um comportamento"""
-        message = message.lower()
+        if self._matcher is None:
+            self._matcher = CompiledBehaviorMatcher(self.behavior_patterns, self.behavior_priorities)
+        
+        behavior = self._matcher.match(message.lower())
         
-        # Lista para armazenar matches encontrados
-        matches = []
+        # Se não encontrou nenhum match, retorna o comportamento default
+        return behavior or self.default_behavior
+
+class EmbeddingBehaviorClassifier:
+    """Classifica mensagens pela similaridade de cosseno com o centróide de cada comportamento"""
+    def __init__(self, behaviors: List[str], centroids: np.ndarray, threshold: float = 0.4):
+        self.behaviors = behaviors
+        self.centroids = centroids
+        self.threshold = threshold
+    
+    @classmethod
+    def from_examples(cls, examples: Dict[str, List[str]], embeddings, threshold: float = 0.4) -> "EmbeddingBehaviorClassifier":
+        """Gera os embeddings dos exemplos em um único lote e calcula os centróides"""
+        behaviors = [behavior for behavior, texts in examples.items() if texts]
+        texts = [text for behavior in behaviors for text in examples[behavior]]
+        if not texts:
+            return cls([], np.zeros((0, 0), dtype=np.float32), threshold)
         
-        for behavior, patterns in self.behavior_patterns.items():
-            for pattern in patterns:
-                if pattern and re.search(pattern, message):
-                    matches.append(behavior)
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
         
-        # Se encontrou matches, retorna o primeiro comportamento encontrado
-        if matches:
-            return matches[0]
+        centroids, start = [], 0
+        for behavior in behaviors:
+            count = len(examples[behavior])
+            centroids.append(vectors[start:start + count].mean(axis=0))
+            start += count
         
-        # Se não encontrou nenhum match, retorna o comportamento default
-        return self.default_behavior
+        matrix = np.vstack(centroids)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return cls(behaviors, np.ascontiguousarray(matrix), threshold)
+    
+    def classify_vector(self, query_embedding: List[float]) -> Optional[str]:
+        """Retorna o comportamento mais próximo, se a similaridade superar o limiar"""
+        if not self.behaviors:
+            return None
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = int(np.argmax(scores))
+        return self.behaviors[best] if scores[best] >= self.threshold else None
+
+DEFAULT_BEHAVIORAL_PROMPT = "Mantenha um atendimento profissional e acolhedor."
+
+def render_system_message(main_prompt: str, behavioral_prompt: Optional[str] = None) -> str:
+    """Monta a parte estável do prompt (personalidade, comportamento e instruções)"""
+    instructions = [
+        "1. Use o contexto fornecido para responder à pergunta",
+        "2. Se a informação não estiver no contexto, diga que não tem informação suficiente para responder",
+        "3. Mantenha a personalidade definida no Prompt Principal"
+    ]
+    # Sem comportamento específico (fallback), a instrução 4 não se aplica
+    if behavioral_prompt is not None:
+        instructions.append("4. Siga o comportamento específico definido acima")
+    
+    return f"""Você deve seguir estritamente as instruções abaixo para responder.
+
+Prompt Principal (Sua Personalidade):
+{main_prompt}
+
+Comportamento Específico para esta Interação:
+{behavioral_prompt or DEFAULT_BEHAVIORAL_PROMPT}
+
+Instruções de Resposta:
+""" + "\n".join(instructions)
+
+def render_messages(system_message: str, rag_context: str, query: str) -> List[Dict[str, str]]:
+    """Prefixo estável (sistema) seguido das mensagens variáveis (contexto e pergunta)"""
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": f"Contexto:\n{rag_context}"},
+        {"role": "user", "content": f"Pergunta do Cliente: {query}"}
+    ]
+
+def render_single_prompt(messages: List[Dict[str, str]]) -> str:
+    """Formato antigo em uma única mensagem, mantido para compatibilidade"""
+    system, context, question = (message["content"] for message in messages)
+    return f"Sistema: {system}\n\n{context}\n\n{question}"
+
+@dataclass
+class BotPrompts:
+    """Prompts de um bot mantidos no cache do processo"""
+    main_prompt: str
+    behavioral_prompts: Dict[str, str]
+    version: Tuple
+    behavior_patterns: Dict[str, List[str]] = field(default_factory=dict)
+    behavior_priorities: Dict[str, int] = field(default_factory=dict)
+    behavior_examples: Dict[str, List[str]] = field(default_factory=dict)
+    checked_at: float = field(default_factory=time.time)
+    _matcher: Optional[CompiledBehaviorMatcher] = field(default=None, repr=False)
+    _centroid_classifiers: Dict[str, EmbeddingBehaviorClassifier] = field(default_factory=dict, repr=False)
+    _system_messages: Dict[str, str] = field(default_factory=dict, repr=False)
+    
+    def get_system_message(self, behavior: str) -> str:
+        """Mensagem de sistema do bot para o comportamento, montada uma única vez"""
+        message = self._system_messages.get(behavior)
+        if message is None:
+            behavioral_prompt = self.behavioral_prompts.get(behavior,
+                self.behavioral_prompts.get('GENERAL', DEFAULT_BEHAVIORAL_PROMPT))
+            message = self._system_messages[behavior] = render_system_message(self.main_prompt, behavioral_prompt)
+        return message
+    
+    def get_matcher(self) -> CompiledBehaviorMatcher:
+        """Compila o classificador do bot uma única vez e o compartilha entre sessões"""
+        if self._matcher is None:
+            self._matcher = CompiledBehaviorMatcher(self.behavior_patterns, self.behavior_priorities)
+        return self._matcher
+    
+    def get_centroid_classifier(self, embeddings, threshold: float) -> EmbeddingBehaviorClassifier:
+        """Calcula os centróides dos exemplos uma única vez por bot e modelo de embedding"""
+        model_name = getattr(embeddings, 'model_name', None) or getattr(embeddings, 'model', 'default')
+        if model_name not in self._centroid_classifiers:
+            self._centroid_classifiers[model_name] = EmbeddingBehaviorClassifier.from_examples(
+                self.behavior_examples, embeddings, threshold
+            )
+        return self._centroid_classifiers[model_name]
 
 class SupabasePromptStore:
     """Gerencia os prompts armazenados no Supabase"""
-    def __init__(self):
+    # Cache compartilhado por todas as instâncias do processo
+    _cache: Dict[str, BotPrompts] = {}
+    _cache_lock = threading.Lock()
+    
+    def __init__(self, ttl: Optional[float] = None):
         load_dotenv()
-        self.client: Client = create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_KEY')
+        # Importado aqui para evitar import circular (services.chat_service importa este módulo)
+        from services.supabase_pool import get_supabase_client
+        self.client: Client = get_supabase_client()
+        self.ttl = ttl if ttl is not None else float(os.getenv('PROMPT_CACHE_TTL', '60'))
+    
+    @staticmethod
+    def _version(bot_row: dict) -> Tuple:
+        """Calcula a versão dos prompts a partir das colunas updated_at"""
+        behavioral_rows = bot_row.get('behavioral_prompts') or []
+        return (
+            bot_row.get('updated_at'),
+            max((row['updated_at'] for row in behavioral_rows), default=None),
+            len(behavioral_rows)
         )
     
-    def get_bot_prompts(self, bot_id: str) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
-        """Recupera os prompts do bot do Supabase"""
-        try:
-            # Busca o prompt principal
-            bot_response = self.client.table('bots') \
-                .select('main_prompt') \
-                .eq('id', bot_id) \
-                .execute()
-            
-            if not bot_response.data:
-                raise ValueError(f"Bot com ID {bot_id} não encontrado")
-            
-            main_prompt = bot_response.data[0]['main_prompt']
-            
-            # Busca os prompts comportamentais
-            behavioral_response = self.client.table('behavioral_prompts') \
-                .select('behavior_type, prompt') \
-                .eq('bot_id', bot_id) \
-                .execute()
-            
-            # Converte a lista de prompts em um dicionário
-            behavioral_prompts = {
-                row['behavior_type']: row['prompt']
-                for row in behavioral_response.data
-            }
-            
-            # Garante que sempre existe um comportamento GENERAL
-            if 'GENERAL' not in behavioral_prompts:
-                behavioral_prompts['GENERAL'] = """Mantenha um atendimento profissional e acolhedor, 
+    def _fetch_version(self, bot_id: str) -> Optional[Tuple]:
+        """Consulta apenas as colunas updated_at para revalidar o cache"""
+        response = self.client.table('bots') \
+            .select('updated_at, behavioral_prompts(updated_at)') \
+            .eq('id', bot_id) \
+            .execute()
+        
+        if not response.data:
+            return None
+        return self._version(response.data[0])
+    
+    def _load(self, bot_id: str) -> BotPrompts:
+        """Carrega o prompt principal e os comportamentais em uma única consulta"""
+        response = self.client.table('bots') \
+            .select('main_prompt, updated_at, behavioral_prompts(behavior_type, prompt, patterns, priority, examples, updated_at)') \
+            .eq('id', bot_id) \
+            .execute()
+        
+        if not response.data:
+            raise ValueError(f"Bot com ID {bot_id} não encontrado")
+        
+        bot_row = response.data[0]
+        behavioral_rows = bot_row.get('behavioral_prompts') or []
+        
+        # Converte a lista de prompts em um dicionário
+        behavioral_prompts = {
+            row['behavior_type']: row['prompt']
+            for row in behavioral_rows
+        }
+        
+        # Padrões de disparo e prioridades de cada comportamento
+        behavior_patterns = {
+            row['behavior_type']: row.get('patterns') or []
+            for row in behavioral_rows
+        }
+        behavior_priorities = {
+            row['behavior_type']: row.get('priority') or 0
+            for row in behavioral_rows
+        }
+        
+        # Exemplos de mensagens usados pelo classificador por embeddings
+        behavior_examples = {
+            row['behavior_type']: row.get('examples') or []
+            for row in behavioral_rows
+        }
+        
+        # Garante que sempre existe um comportamento GENERAL
+        if 'GENERAL' not in behavioral_prompts:
+            behavioral_prompts['GENERAL'] = """Mantenha um atendimento profissional e acolhedor, 
 focando em entender e atender às necessidades do cliente."""
-            
-            return main_prompt, behavioral_prompts
-            
+        
+        return BotPrompts(
+            main_prompt=bot_row['main_prompt'],
+            behavioral_prompts=behavioral_prompts,
+            version=self._version(bot_row),
+            behavior_patterns=behavior_patterns,
+            behavior_priorities=behavior_priorities,
+            behavior_examples=behavior_examples
+        )
+    
+    def get_cached_prompts(self, bot_id: str) -> BotPrompts:
+        """Retorna os prompts do cache, revalidando-os quando o TTL expira"""
+        with self._cache_lock:
+            entry = self._cache.get(bot_id)
+        
+        now = time.time()
+        if entry is not None and now - entry.checked_at < self.ttl:
+            return entry
+        
+        # TTL expirado: uma consulta leve confirma se algo mudou
+        if entry is not None and self._fetch_version(bot_id) == entry.version:
+            entry.checked_at = now
+            return entry
+        
+        entry = self._load(bot_id)
+        with self._cache_lock:
+            self._cache[bot_id] = entry
+        return entry
+    
+    @classmethod
+    def invalidate(cls, bot_id: Optional[str] = None):
+        """Remove um bot (ou todos) do cache de prompts"""
+        with cls._cache_lock:
+            if bot_id is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(bot_id, None)
+    
+    def get_prompts(self, bot_id: str) -> BotPrompts:
+        """Recupera os prompts do bot (com padrões e prioridades) do Supabase"""
+        try:
+            return self.get_cached_prompts(bot_id)
         except Exception as e:
             raise ValueError(f"Erro ao recuperar prompts do bot: {str(e)}")
+    
+    def get_bot_prompts(self, bot_id: str) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        """Recupera os prompts do bot do Supabase"""
+        prompts = self.get_prompts(bot_id)
+        return prompts.main_prompt, prompts.behavioral_prompts
 
 class PromptMiddleware:
     """Sistema de middleware para gerenciar prompts e contexto"""
-    def __init__(self, bot_id: str):
+    def __init__(self, bot_id: str, embeddings=None):
         self.context = ConversationContext()
         self.classifier = BehaviorClassifier()
+        self.embedding_classifier: Optional[EmbeddingBehaviorClassifier] = None
         self.prompt_store = SupabasePromptStore()
         self.bot_id = bot_id
         
-        # Carrega os prompts do bot
-        self.main_prompt, self.behavioral_prompts = self.prompt_store.get_bot_prompts(bot_id)
+        # Carrega os prompts do bot (compartilhados pelo cache do processo)
+        self.prompts = self.prompt_store.get_prompts(bot_id)
+        self.main_prompt, self.behavioral_prompts = self.prompts.main_prompt, self.prompts.behavioral_prompts
         if not self.main_prompt or not self.behavioral_prompts:
             raise ValueError(f"Não foi possível carregar os prompts para o bot {bot_id}")
         
-        # Atualiza os padrões do classificador com os comportamentos disponíveis
-        self.classifier.update_patterns(self.behavioral_prompts)
+        # Atualiza os padrões do classificador, reutilizando o matcher compilado do bot
+        self.classifier.update_patterns(
+            self.behavioral_prompts,
+            self.prompts.behavior_patterns,
+            self.prompts.behavior_priorities,
+            matcher=self.prompts.get_matcher()
+        )
+        
+        # Classificador opcional por centróides de embeddings (BEHAVIOR_CLASSIFIER=embedding)
+        if embeddings is not None and os.getenv('BEHAVIOR_CLASSIFIER', 'regex').lower() == 'embedding':
+            self.embedding_classifier = self.prompts.get_centroid_classifier(
+                embeddings,
+                threshold=float(os.getenv('BEHAVIOR_EMBEDDING_THRESHOLD', '0.4'))
+            )
+    
+    def classify(self, query: str, query_embedding: Optional[List[float]] = None) -> str:
+        """Classifica a query, usando o embedding já calculado para a busca quando disponível"""
+        if self.embedding_classifier is not None and query_embedding is not None:
+            behavior = self.embedding_classifier.classify_vector(query_embedding)
+            if behavior:
+                return behavior
+        return self.classifier.classify(query)
     
-    def process_query(self, query: str, rag_context: str) -> Tuple[str, str]:
-        """Processa a query e retorna o prompt final e o comportamento identificado"""
+    def build_messages(self, query: str, rag_context: str, query_embedding: Optional[List[float]] = None) -> Tuple[List[Dict[str, str]], str]:
+        """Processa a query e retorna as mensagens do chat e o comportamento identificado"""
         try:
             # Classifica o comportamento
-            behavior = self.classifier.classify(query)
+            behavior = self.classify(query, query_embedding)
             
             # Cria nova interação
             interaction = Interaction(
@@ -145,56 +448,26 @@ class PromptMiddleware:
             )
             self.context.add_interaction(interaction)
             
-            # Recupera o prompt comportamental com fallback para GENERAL
-            behavioral_prompt = self.behavioral_prompts.get(behavior, 
-                self.behavioral_prompts.get('GENERAL', 
-                    "Mantenha um atendimento profissional e acolhedor."))
-            
-            # Gera o prompt combinado
-            final_prompt = f"""Sistema: Você deve seguir estritamente as instruções abaixo para responder.
-
-Prompt Principal (Sua Personalidade):
-{self.main_prompt}
-
-Comportamento Específico para esta Interação:
-{behavioral_prompt}
-
-Instruções de Resposta:
-1. Use o contexto abaixo para responder à pergunta
-2. Se a informação não estiver no contexto, diga que não tem informação suficiente para responder
-3. Mantenha a personalidade definida no Prompt Principal
-4. Siga o comportamento específico definido acima
-
-Contexto:
-{rag_context}
-
-Pergunta do Cliente: {query}"""
-            
-            return final_prompt, behavior
+            # A mensagem de sistema é fixa por bot e comportamento (prefixo estável
+            # para o cache de prompts do provedor); só contexto e pergunta variam
+            return render_messages(self.prompts.get_system_message(behavior), rag_context, query), behavior
             
         except Exception as e:
             # Em caso de erro, usa o comportamento GENERAL como fallback
-            return self._generate_fallback_prompt(query, rag_context), "GENERAL"
+            return self._generate_fallback_messages(query, rag_context), "GENERAL"
+    
+    def process_query(self, query: str, rag_context: str, query_embedding: Optional[List[float]] = None) -> Tuple[str, str]:
+        """Processa a query e retorna o prompt final (em uma única mensagem) e o comportamento identificado"""
+        messages, behavior = self.build_messages(query, rag_context, query_embedding)
+        return render_single_prompt(messages), behavior
+    
+    def _generate_fallback_messages(self, query: str, rag_context: str) -> List[Dict[str, str]]:
+        """Gera as mensagens de fallback em caso de erro"""
+        return render_messages(render_system_message(self.main_prompt), rag_context, query)
     
     def _generate_fallback_prompt(self, query: str, rag_context: str) -> str:
         """Gera um prompt de fallback em caso de erro"""
-        return f"""Sistema: Você deve seguir estritamente as instruções abaixo para responder.
-
-Prompt Principal (Sua Personalidade):
-{self.main_prompt}
-
-Comportamento Específico para esta Interação:
-Mantenha um atendimento profissional e acolhedor.
-
-Instruções de Resposta:
-1. Use o contexto abaixo para responder à pergunta
-2. Se a informação não estiver no contexto, diga que não tem informação suficiente para responder
-3. Mantenha a personalidade definida no Prompt Principal
-
-Contexto:
-{rag_context}
-
-Pergunta do Cliente: {query}"""
+        return render_single_prompt(self._generate_fallback_messages(query, rag_context))
 
 # Exemplo de uso:
 """
@@ -208,9 +481,9 @@ def get_rag_response(query: str, client: Groq, vector_store: Qdrant) -> str:
     results = vector_store.similarity_search(query, k=3)
     rag_context = "\n".join([doc.page_content for doc in results])
     
-    # Processa através do middleware
-    final_prompt, behavior = middleware.process_query(query, rag_context)
+    # Processa através do middleware (sistema estável + contexto + pergunta)
+    messages, behavior = middleware.build_messages(query, rag_context)
     
-    # Usa o prompt processado para obter a resposta
-    return get_groq_response(client, final_prompt)
+    # Usa as mensagens processadas para obter a resposta
+    return get_groq_response(client, messages)
 """ 
\ No newline at end of file
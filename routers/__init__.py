@@ -1,5 +1,6 @@
 from .bot_router import router as bot_router
 from .chat_router import router as chat_router
+from .stats_router import router as stats_router
 
-__all__ = ['bot_router', 'chat_router']
+__all__ = ['bot_router', 'chat_router', 'stats_router']
  
\ No newline at end of file
@@ -2,8 +2,7 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict
 from services.bot_creator import BotCreator
 from models.bot_models import BotRequest, BotResponse
-from supabase import create_client
-import os
+from services.supabase_pool import get_supabase_client
 
 router = APIRouter()
 creator = BotCreator()
@@ -19,10 +18,7 @@ async def create_bot(request: BotRequest):
         )
         
         # Get bot details from Supabase
-        supabase = create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_KEY')
-        )
+        supabase = get_supabase_client()
         
         # Get bot data
         bot_data = supabase.table('bots') \
@@ -1,13 +1,29 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict
 from services.chat_service import ChatSession
+from services.session_store import SessionStore
+from services.session_warmup import SessionWarmup, SessionNotReady
+from services.llm_service import sse_stream, SSE_HEADERS
 from models.chat_models import ChatRequest, ChatResponse, SessionConfig
-import os
 
 router = APIRouter()
 
 # Armazena as sessões ativas
-active_sessions: Dict[str, ChatSession] = {}
+active_sessions = SessionStore(restore=ChatSession.from_record, namespace='chat')
+session_warmup = SessionWarmup(active_sessions)
+
+async def get_session(session_id: str) -> ChatSession:
+    """Busca a sessão pronta, aguardando a preparação ou reidratando-a do backend compartilhado"""
+    try:
+        session = await session_warmup.get(session_id)
+    except SessionNotReady as e:
+        raise HTTPException(status_code=503, detail=e.progress.to_dict(), headers={"Retry-After": "2"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return session
 
 @router.post("/session")
 async def create_session(config: SessionConfig) -> Dict[str, str]:
@@ -15,27 +31,46 @@ async def create_session(config: SessionConfig) -> Dict[str, str]:
     try:
         session_id = f"{config.bot_id}_{'_'.join(config.processing_ids)}"
         if session_id not in active_sessions:
-            active_sessions[session_id] = ChatSession(config.bot_id, config.processing_ids)
+            # A indexação roda em segundo plano; o progresso é consultado em /status
+            await session_warmup.create(session_id, lambda progress: ChatSession(config.bot_id, config.processing_ids, progress=progress))
         return {"session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{session_id}/status")
+async def session_status(session_id: str) -> Dict[str, Any]:
+    """Informa o progresso da preparação da sessão (chunks carregados, embedados e indexados)"""
+    status = await session_warmup.status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return status
+
 @router.post("/{session_id}")
 async def chat(session_id: str, request: ChatRequest) -> ChatResponse:
     """Processa uma mensagem do chat"""
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    session = await get_session(session_id)
     
     try:
-        session = active_sessions[session_id]
-        response = session.get_rag_response(request.message)
+        response = await session.get_rag_response(request.message, request.filters)
+        await active_sessions.save(session_id, session)
         return ChatResponse(response=response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{session_id}/stream")
+async def chat_stream(session_id: str, request: ChatRequest) -> StreamingResponse:
+    """Processa uma mensagem do chat enviando os tokens via SSE"""
+    session = await get_session(session_id)
+    
+    tokens = active_sessions.persist_after(session_id, session, session.stream_rag_response(request.message, request.filters))
+    return StreamingResponse(
+        sse_stream(tokens),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.delete("/{session_id}")
 async def end_session(session_id: str):
     """Encerra uma sessão de chat"""
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+    await session_warmup.discard(session_id)
     return {"status": "success"} 
\ No newline at end of file
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from typing import Any, Dict
+from services.supabase_pool import supabase_pool_stats
+from services.index_registry import index_registry
+from routers.chat_router import active_sessions, session_warmup
+from services.answer_cache import answer_cache
+from services.completion_cache import completion_cache
+from services.context_builder import prompt_token_stats
+from services.lexical_index import retrieval_stats
+from services.embedding_cache import query_embedding_cache, embedding_scheduler_stats
+
+router = APIRouter()
+
+@router.get("/")
+async def get_stats() -> Dict[str, Any]:
+    """Retorna métricas de uso dos recursos compartilhados do processo"""
+    return {
+        "supabase": supabase_pool_stats(),
+        "index": index_registry.stats(),
+        "sessions": active_sessions.stats(),
+        "session_builds": session_warmup.stats(),
+        "answers": answer_cache.stats(),
+        "completions": completion_cache.stats(),
+        "prompt_tokens": prompt_token_stats.stats(),
+        "retrieval": retrieval_stats.stats(),
+        "query_embeddings": query_embedding_cache.stats(),
+        "embedding_batches": embedding_scheduler_stats()
+    }
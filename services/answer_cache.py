@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+class SemanticAnswerCache:
+    """Cache de respostas por similaridade do embedding da pergunta
+
+    As entradas são agrupadas por chave (bot, documentos, comportamento e versões);
+    dentro do grupo, uma pergunta com cosseno acima do limiar reaproveita a resposta.
+    Não há invalidação explícita: quando prompts ou documentos mudam, a chave muda e
+    os grupos antigos deixam de ser consultados até expirarem (TTL) ou serem evictados.
+    """
+    def __init__(self,
+                 enabled: Optional[bool] = None,
+                 threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.enabled = enabled if enabled is not None else os.getenv('ANSWER_CACHE_ENABLED', 'false').lower() == 'true'
+        self.threshold = threshold if threshold is not None else float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+        self.max_entries = max_entries or int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '1000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+        # Ordem LRU global: id da entrada -> (chave, vetor normalizado, resposta, criação)
+        self._entries: "OrderedDict[int, Tuple[Hashable, np.ndarray, str, float]]" = OrderedDict()
+        self._groups: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(bot_id: str, processing_ids: List[str], behavior: str, *versions: Any) -> Hashable:
+        """Chave do grupo; as versões mudam quando os prompts ou os documentos mudam"""
+        return (bot_id, tuple(sorted(processing_ids)), behavior) + tuple(versions)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _remove(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        group = self._groups.get(key)
+        if group is not None:
+            group.remove(entry_id)
+            if not group:
+                del self._groups[key]
+
+    def lookup(self, key: Hashable, query_embedding: List[float]) -> Optional[str]:
+        """Retorna a resposta de uma pergunta similar já respondida, se houver"""
+        if not self.enabled:
+            return None
+
+        query = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            group = self._groups.get(key, [])
+            for entry_id in [entry_id for entry_id in group if now - self._entries[entry_id][3] > self.ttl]:
+                self._remove(entry_id)
+            group = self._groups.get(key)
+
+            if group:
+                vectors = np.stack([self._entries[entry_id][1] for entry_id in group])
+                scores = vectors @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = group[best]
+                    self._entries.move_to_end(entry_id)
+                    self.counters['hits'] += 1
+                    return self._entries[entry_id][2]
+
+            self.counters['misses'] += 1
+            return None
+
+    def store(self, key: Hashable, query_embedding: List[float], answer: str):
+        """Guarda a resposta, evictando as entradas usadas há mais tempo"""
+        if not self.enabled or not answer:
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, self._normalize(query_embedding), answer, time.time())
+            self._groups.setdefault(key, []).append(entry_id)
+            self.counters['stores'] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters['evictions'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna a configuração e os contadores do cache"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'groups': len(self._groups),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                **self.counters
+            }
+
+# Cache compartilhado pelo processo (ANSWER_CACHE_ENABLED=true para ativar)
+answer_cache = SemanticAnswerCache()
@@ -1,73 +1,28 @@
-import os
-from typing import List, Dict
+import sys
+import json
+import asyncio
+from typing import Any, AsyncIterator, Hashable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from groq import Groq
-from langchain_openai import OpenAIEmbeddings
 from langchain.schema import Document, SystemMessage, HumanMessage, AIMessage
-from langchain_community.vectorstores import Qdrant
+from services.embedding_cache import get_embeddings
+from services.document_loader import build_chunk_shard
+from services.index_registry import index_registry, ShardedVectorStore
+from services.answer_cache import answer_cache
+from services.context_builder import context_packer
+from services.lexical_index import hybrid_search
+from services.llm_service import get_async_groq_client, get_groq_response, stream_groq_response
 from prompt_middleware import PromptMiddleware
-from supabase import create_client, Client
-
-def load_document_chunks(processing_id: str) -> List[Document]:
-    """Load document chunks from Supabase"""
-    supabase = create_client(
-        os.getenv('SUPABASE_URL'),
-        os.getenv('SUPABASE_SERVICE_KEY')
-    )
-    
-    response = supabase.table('document_chunks') \
-        .select('chunk_text, chunk_index') \
-        .eq('processing_id', processing_id) \
-        .order('chunk_index') \
-        .execute()
-    
-    if not response.data:
-        raise ValueError(f"Nenhum documento encontrado para o processing_id: {processing_id}")
-    
-    documents = []
-    for chunk in response.data:
-        doc = Document(
-            page_content=chunk['chunk_text'],
-            metadata={
-                'chunk_index': chunk['chunk_index'],
-                'processing_id': processing_id
-            }
-        )
-        documents.append(doc)
-    
-    return documents
-
-def setup_vector_store(documents: List[Document], embeddings, collection_name: str):
-    """Set up the Qdrant vector store with the documents"""
-    return Qdrant.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        location=":memory:" if os.getenv('QDRANT_HOST') == 'localhost' else None,
-        url=f"http://{os.getenv('QDRANT_HOST')}:{os.getenv('QDRANT_PORT')}" if os.getenv('QDRANT_HOST') != 'localhost' else None,
-        api_key=os.getenv('QDRANT_API_KEY'),
-        collection_name=collection_name
-    )
-
-def get_groq_response(client: Groq, prompt: str) -> str:
-    """Get response from Groq model"""
-    completion = client.chat.completions.create(
-        model=os.getenv('GROQ_MODEL_NAME', 'deepseek-r1-distill-llama-70b'),
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.6,
-        max_completion_tokens=1024,
-        top_p=0.95,
-        stream=False,
-        reasoning_format="hidden"
-    )
-    
-    return completion.choices[0].message.content
+from supabase import Client
 
 class ChatSession:
-    def __init__(self, bot_id: str, processing_ids: List[str]):
+    def __init__(self, bot_id: str, processing_ids: List[str], progress=None):
         self.bot_id = bot_id
         self.processing_ids = processing_ids
+        self.progress = progress
         self.middleware = None
         self.vector_store = None
+        self.embeddings = None
+        self.shards = []
         self.groq_client = None
         self.messages = []  # Lista de mensagens no formato LangChain
         self.setup()
@@ -75,32 +30,64 @@ class ChatSession:
     def setup(self):
         """Inicializa os componentes necessários para a sessão"""
         load_dotenv()
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        embeddings = OpenAIEmbeddings(model=os.getenv('EMBEDDING_MODEL_NAME', 'text-embedding-3-small'))
+        self.groq_client = get_async_groq_client()
+        embeddings = self.embeddings = get_embeddings()
         
         # Inicializa o middleware
-        self.middleware = PromptMiddleware(bot_id=self.bot_id)
+        self.middleware = PromptMiddleware(bot_id=self.bot_id, embeddings=embeddings)
         
-        # Carrega e combina todos os documentos
-        all_documents = []
-        for proc_id in self.processing_ids:
-            documents = load_document_chunks(proc_id)
-            all_documents.extend(documents)
+        # Obtém um shard compartilhado por processing_id (construído apenas uma vez);
+        # os shards ausentes são carregados e indexados em paralelo
+        self.shards = index_registry.acquire_many(
+            self.processing_ids,
+            lambda proc_id: lambda: build_chunk_shard(proc_id, embeddings, self.progress)
+        )
         
-        # Configura o vector store com todos os documentos
-        collection_name = f"chat_{self.bot_id}_{'_'.join(self.processing_ids)}"
-        self.vector_store = setup_vector_store(all_documents, embeddings, collection_name)
+        self.vector_store = ShardedVectorStore(self.shards, embeddings)
         
         # Inicializa a lista de mensagens com a mensagem do sistema
         self.messages = [
             SystemMessage(content="Você é um assistente útil que responde perguntas com base no contexto fornecido.")
         ]
     
-    def get_rag_response(self, query: str) -> str:
-        """Get RAG-enhanced response for a query"""
-        # Gera o contexto RAG
-        results = self.vector_store.similarity_search(query, k=3)
-        rag_context = "\n".join([doc.page_content for doc in results])
+    async def _answer_cache_key(self, behavior: str, filters: Optional[Dict[str, Any]] = None) -> Optional[Hashable]:
+        """Chave do cache de respostas, versionada pelos prompts do bot, pelos shards e pelos filtros"""
+        if not answer_cache.enabled:
+            return None
+        
+        # A versão dos prompts é revalidada pelo cache do processo (PROMPT_CACHE_TTL)
+        loop = asyncio.get_running_loop()
+        prompts = await loop.run_in_executor(None, self.middleware.prompt_store.get_cached_prompts, self.bot_id)
+        return answer_cache.make_key(
+            self.bot_id,
+            self.processing_ids,
+            behavior,
+            prompts.version,
+            tuple(shard.built_at for shard in self.shards),
+            json.dumps(filters, sort_keys=True, default=str) if filters else None
+        )
+    
+    async def _vector_search(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> Tuple[List[float], List[Tuple[Document, float]]]:
+        """Gera o embedding da consulta e busca nos shards (fora do event loop)"""
+        query_embedding = await self.embeddings.aembed_query(query)
+        return query_embedding, await self.vector_store.asimilarity_search_with_score_by_vector(query_embedding, k=k, filter=filters)
+    
+    async def _prepare_prompt(self, query: str, filters: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Dict[str, str]], Optional[List[float]], Optional[Hashable]]:
+        """Recupera o contexto e retorna o prompt aumentado, as mensagens finais, o embedding e a chave do cache"""
+        # Consultas lexicais são respondidas pelo BM25 sem embedding; as demais
+        # combinam BM25 e busca vetorial. O embedding da consulta, quando gerado,
+        # também é reutilizado pela classificação de comportamento
+        results, query_embedding, _ = await hybrid_search(
+            query,
+            context_packer.candidates,
+            (lambda terms, k: self.vector_store.lexical_search_terms(terms, k, filter=filters)) if self.vector_store.has_lexical_index else None,
+            lambda k: self._vector_search(query, k, filters),
+            context_packer.min_score
+        )
+        
+        # Seleciona os chunks não duplicados dentro do orçamento de tokens
+        # (o score mínimo já foi aplicado aos resultados vetoriais)
+        rag_context = context_packer.pack(results, min_score=0.0).rag_context
         
         # Cria o prompt aumentado com o contexto
         augmented_prompt = f"""Use o contexto abaixo para responder à pergunta.
@@ -110,20 +97,89 @@ Contexto:
 
 Pergunta: {query}"""
         
-        # Adiciona a mensagem do usuário
-        self.messages.append(HumanMessage(content=augmented_prompt))
-        
         # Processa através do middleware
-        final_prompt, behavior = self.middleware.process_query(query, rag_context)
-        
-        # Obtém a resposta
-        response = get_groq_response(self.groq_client, final_prompt)
+        messages, behavior = self.middleware.build_messages(query, rag_context, query_embedding)
         
-        # Adiciona a resposta do assistente ao histórico
+        cache_key = await self._answer_cache_key(behavior, filters) if query_embedding is not None else None
+        return augmented_prompt, messages, query_embedding, cache_key
+    
+    def _record_interaction(self, augmented_prompt: str, response: str):
+        """Adiciona a interação ao histórico"""
+        # Só é chamado depois da resposta, para que mensagens concorrentes
+        # na mesma sessão não se intercalem
+        self.messages.append(HumanMessage(content=augmented_prompt))
         self.messages.append(AIMessage(content=response))
         
         # Mantém apenas as últimas N mensagens (sistema + 3 pares de interação)
         if len(self.messages) > 7:  # 1 sistema + 6 mensagens (3 pares)
             self.messages = [self.messages[0]] + self.messages[-6:]
+    
+    async def get_rag_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Get RAG-enhanced response for a query"""
+        augmented_prompt, messages, query_embedding, cache_key = await self._prepare_prompt(query, filters)
+        
+        # Perguntas semelhantes já respondidas dispensam a chamada ao modelo
+        response = answer_cache.lookup(cache_key, query_embedding) if cache_key else None
+        if response is None:
+            response = await get_groq_response(self.groq_client, messages)
+            if cache_key:
+                answer_cache.store(cache_key, query_embedding, response)
+        
+        self._record_interaction(augmented_prompt, response)
+        return response
+    
+    async def stream_rag_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream RAG-enhanced response tokens for a query"""
+        augmented_prompt, messages, query_embedding, cache_key = await self._prepare_prompt(query, filters)
         
-        return response 
\ No newline at end of file
+        cached = answer_cache.lookup(cache_key, query_embedding) if cache_key else None
+        if cached is not None:
+            yield cached
+            self._record_interaction(augmented_prompt, cached)
+            return
+        
+        parts = []
+        async for token in stream_groq_response(self.groq_client, messages):
+            parts.append(token)
+            yield token
+        
+        # O histórico só é atualizado quando o stream termina por completo
+        response = "".join(parts)
+        if cache_key:
+            answer_cache.store(cache_key, query_embedding, response)
+        self._record_interaction(augmented_prompt, response)
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Estado serializável da sessão (o índice é referenciado pelos processing_ids)"""
+        return {
+            'bot_id': self.bot_id,
+            'processing_ids': self.processing_ids,
+            'messages': [
+                {'role': 'user' if isinstance(message, HumanMessage) else 'assistant', 'content': message.content}
+                for message in self.messages[1:]
+            ]
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], progress=None) -> "ChatSession":
+        """Reconstrói a sessão a partir do estado salvo por outro worker"""
+        session = cls(record['bot_id'], record['processing_ids'], progress)
+        session.apply_record(record)
+        return session
+    
+    def apply_record(self, record: Dict[str, Any]):
+        """Substitui o histórico pelo gravado por outro worker (a mensagem de sistema é mantida)"""
+        self.messages[1:] = [
+            HumanMessage(content=message['content']) if message['role'] == 'user' else AIMessage(content=message['content'])
+            for message in record.get('messages', [])
+        ]
+    
+    def estimate_size(self) -> int:
+        """Estimativa aproximada da memória da sessão (shards compartilhados são contados à parte)"""
+        return 16 * 1024 + sum(sys.getsizeof(message.content) for message in self.messages)
+    
+    def close(self):
+        """Libera os shards compartilhados usados pela sessão"""
+        for shard in self.shards:
+            index_registry.release(shard.key)
+        self.shards = []
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+class DiskCompletionTier:
+    """Camada persistente do cache de completions em SQLite"""
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Retorna a resposta e o momento em que foi gerada"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM completions WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def put(self, key: str, response: str, created_at: float):
+        """Armazena a resposta e aplica o limite de tamanho"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, created_at, created_at)
+            )
+            size = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if size > self.max_entries:
+                # Remove um pouco além do necessário para não evictar a cada inserção
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY last_access ASC LIMIT ?)",
+                    (size - self.max_entries + self.max_entries // 10,)
+                )
+
+class CompletionCache:
+    """Cache exato de completions: LRU em memória com camada opcional em disco"""
+    def __init__(self,
+                 enabled: Optional[bool] = None,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 disk: Optional[DiskCompletionTier] = None):
+        self.enabled = enabled if enabled is not None else os.getenv('COMPLETION_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_entries = max_entries or int(os.getenv('COMPLETION_CACHE_MAX_ENTRIES', '512'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('COMPLETION_CACHE_TTL', '3600'))
+        self.disk = disk
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(model: str, messages: Any, params: Dict[str, Any]) -> str:
+        """Hash do modelo, do prompt completo e dos parâmetros de amostragem"""
+        payload = json.dumps([model, messages, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _fresh(self, created_at: float) -> bool:
+        return self.ttl <= 0 or time.time() - created_at <= self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Procura a resposta na memória e depois no disco (chamar fora do event loop se houver disco)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[0]
+
+        entry = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if entry is not None and self._fresh(entry[1]):
+                self._remember(key, entry)
+                self.counters['disk_hits'] += 1
+                return entry[0]
+            self.counters['misses'] += 1
+            return None
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def put(self, key: str, response: str):
+        """Armazena a resposta nas duas camadas"""
+        if not self.enabled or not response:
+            return
+
+        entry = (response, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            self.counters['stores'] += 1
+        if self.disk is not None:
+            self.disk.put(key, *entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna a configuração e os contadores do cache"""
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = lookups - self.counters['misses']
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk': self.disk.path if self.disk is not None else None,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                **self.counters
+            }
+
+def _create_cache() -> CompletionCache:
+    path = os.getenv('COMPLETION_CACHE_PATH')
+    disk = DiskCompletionTier(path, int(os.getenv('COMPLETION_CACHE_DISK_MAX_ENTRIES', '10000'))) if path else None
+    return CompletionCache(disk=disk)
+
+# Cache compartilhado pelo processo (COMPLETION_CACHE_PATH ativa a camada em disco)
+completion_cache = _create_cache()
@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from langchain.schema import Document
+
+_WORD = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (~4 caracteres por token)"""
+    return (len(text) + 3) // 4
+
+def _token_set(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+@dataclass
+class PackedContext:
+    """Contexto selecionado para o prompt, dentro do orçamento de tokens"""
+    chunks: List[str] = field(default_factory=list)
+    history: List[str] = field(default_factory=list)
+    tokens: int = 0
+    dropped_duplicates: int = 0
+    dropped_low_score: int = 0
+    dropped_budget: int = 0
+
+    @property
+    def rag_context(self) -> str:
+        return "\n".join(self.chunks)
+
+class ContextPacker:
+    """Seleciona chunks e histórico dentro de um orçamento de tokens
+
+    Os chunks são percorridos por score: os abaixo do limiar são descartados, os
+    quase duplicados de um já escolhido (Jaccard dos termos) são ignorados e o
+    restante entra enquanto couber no orçamento.
+    """
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 history_tokens: Optional[int] = None,
+                 min_score: Optional[float] = None,
+                 duplicate_threshold: Optional[float] = None,
+                 candidates: Optional[int] = None):
+        self.max_tokens = max_tokens or int(os.getenv('CONTEXT_MAX_TOKENS', '2000'))
+        self.history_tokens = history_tokens if history_tokens is not None else int(os.getenv('CONTEXT_HISTORY_TOKENS', '600'))
+        self.min_score = min_score if min_score is not None else float(os.getenv('CONTEXT_MIN_SCORE', '0.2'))
+        self.duplicate_threshold = duplicate_threshold if duplicate_threshold is not None else float(os.getenv('CONTEXT_DUPLICATE_THRESHOLD', '0.8'))
+        # Quantos resultados buscar no índice antes da seleção
+        self.candidates = candidates or int(os.getenv('CONTEXT_CANDIDATES', '8'))
+
+    def pack(self, results: Sequence[Tuple[Document, float]], history: Sequence[str] = (), min_score: Optional[float] = None) -> PackedContext:
+        """Empacota os resultados (documento, score) e os turnos de histórico (do mais antigo ao mais recente)"""
+        packed = PackedContext()
+        min_score = self.min_score if min_score is None else min_score
+
+        # Histórico: os turnos mais recentes têm prioridade dentro da sua fatia do orçamento
+        history_budget = min(self.history_tokens, self.max_tokens)
+        for turn in reversed(history):
+            cost = estimate_tokens(turn)
+            if packed.tokens + cost > history_budget:
+                break
+            packed.history.insert(0, turn)
+            packed.tokens += cost
+
+        selected: List[Set[str]] = []
+        for doc, score in sorted(results, key=lambda item: item[1], reverse=True):
+            if score < min_score:
+                packed.dropped_low_score += 1
+                continue
+
+            terms = _token_set(doc.page_content)
+            if any(_jaccard(terms, other) >= self.duplicate_threshold for other in selected):
+                packed.dropped_duplicates += 1
+                continue
+
+            cost = estimate_tokens(doc.page_content)
+            if packed.tokens + cost > self.max_tokens:
+                packed.dropped_budget += 1
+                continue
+
+            selected.append(terms)
+            packed.chunks.append(doc.page_content)
+            packed.tokens += cost
+
+        return packed
+
+class PromptTokenStats:
+    """Contabiliza o tamanho dos prompts enviados ao modelo"""
+    def __init__(self):
+        self.requests = 0
+        self.estimated_total = 0
+        self.estimated_max = 0
+        self.usage_requests = 0
+        self.usage_total = 0
+        self.last: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def record(self, estimated: int, actual: Optional[int] = None):
+        """Registra um prompt (estimativa local e, se disponível, o uso informado pela Groq)"""
+        with self._lock:
+            self.requests += 1
+            self.estimated_total += estimated
+            self.estimated_max = max(self.estimated_max, estimated)
+            if actual is not None:
+                self.usage_requests += 1
+                self.usage_total += actual
+            self.last = {'estimated': estimated, 'actual': actual}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'estimated_avg': round(self.estimated_total / self.requests, 1) if self.requests else 0.0,
+                'estimated_max': self.estimated_max,
+                'actual_avg': round(self.usage_total / self.usage_requests, 1) if self.usage_requests else None,
+                'last': self.last
+            }
+
+# Empacotador e estatísticas compartilhados pelo processo
+context_packer = ContextPacker()
+prompt_token_stats = PromptTokenStats()
@@ -0,0 +1,105 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+from langchain.schema import Document
+from services.supabase_pool import get_supabase_client
+from services.vector_store import set_embeddings, setup_vector_store
+from services.index_registry import IndexShard
+from services.lexical_index import BM25Index
+
+# Pool usado para buscar a próxima página enquanto a atual é indexada
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CHUNK_LOADER_WORKERS', '8')),
+    thread_name_prefix='chunk-prefetch'
+)
+
+def iter_document_chunk_pages(processing_id: str, page_size: Optional[int] = None) -> Iterator[List[Document]]:
+    """Carrega os chunks do Supabase em páginas, com paginação por chunk_index"""
+    page_size = page_size or int(os.getenv('CHUNK_PAGE_SIZE', '500'))
+    supabase = get_supabase_client()
+
+    last_index = None
+    while True:
+        query = supabase.table('document_chunks') \
+            .select('chunk_text, chunk_index') \
+            .eq('processing_id', processing_id)
+
+        # Paginação por chave: continua a partir do último chunk_index recebido
+        if last_index is not None:
+            query = query.gt('chunk_index', last_index)
+
+        response = query.order('chunk_index').limit(page_size).execute()
+
+        if not response.data:
+            if last_index is None:
+                raise ValueError(f"Nenhum documento encontrado para o processing_id: {processing_id}")
+            return
+
+        yield [
+            Document(
+                page_content=chunk['chunk_text'],
+                metadata={
+                    'chunk_index': chunk['chunk_index'],
+                    'processing_id': processing_id
+                }
+            )
+            for chunk in response.data
+        ]
+
+        # Não para em páginas curtas: o PostgREST limita cada resposta ao max-rows do servidor,
+        # que pode ser menor que page_size; só uma página vazia indica o fim
+        last_index = response.data[-1]['chunk_index']
+
+def prefetch_pages(pages: Iterator[List[Document]]) -> Iterator[List[Document]]:
+    """Busca a próxima página em segundo plano enquanto a atual é processada"""
+    future = _prefetch_executor.submit(next, pages, None)
+    while True:
+        page = future.result()
+        if page is None:
+            return
+        future = _prefetch_executor.submit(next, pages, None)
+        yield page
+
+def load_document_chunks(processing_id: str) -> List[Document]:
+    """Load document chunks from Supabase"""
+    return [doc for page in iter_document_chunk_pages(processing_id) for doc in page]
+
+def chunk_ids(documents: List[Document]) -> List[str]:
+    """IDs determinísticos evitam pontos duplicados ao reconstruir a coleção"""
+    return [
+        str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc.metadata['processing_id']}/{doc.metadata['chunk_index']}"))
+        for doc in documents
+    ]
+
+def build_chunk_index(processing_id: str, embeddings, progress=None, lexical_index: Optional[BM25Index] = None):
+    """Constrói o índice vetorial de um único processing_id, página a página"""
+    indexing_embeddings = progress.track(embeddings) if progress is not None else embeddings
+
+    vector_store = None
+    for page in prefetch_pages(iter_document_chunk_pages(processing_id)):
+        if progress is not None:
+            progress.loaded(len(page))
+
+        ids = chunk_ids(page)
+        if vector_store is None:
+            vector_store = setup_vector_store(page, indexing_embeddings, f"chunks_{processing_id}", ids=ids)
+        else:
+            vector_store.add_documents(page, ids=ids)
+
+        if lexical_index is not None:
+            lexical_index.add_documents(page, ids=ids)
+
+        if progress is not None:
+            progress.indexed(len(page))
+
+    # O shard é compartilhado e sobrevive à sessão: só a carga inicial conta no progresso
+    if vector_store is not None:
+        set_embeddings(vector_store, embeddings)
+    return vector_store
+
+def build_chunk_shard(processing_id: str, embeddings, progress=None) -> IndexShard:
+    """Constrói o shard de um processing_id: índice vetorial e índice BM25 dos mesmos chunks"""
+    lexical_index = BM25Index()
+    vector_store = build_chunk_index(processing_id, embeddings, progress, lexical_index)
+    return IndexShard(key=processing_id, vector_store=vector_store, lexical_index=lexical_index)
@@ -0,0 +1,278 @@
+import os
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from services.embedding_scheduler import BULK, INTERACTIVE, EmbeddingScheduler
+
+# Limite de variáveis por consulta do SQLite
+_SQLITE_BATCH = 500
+
+class EmbeddingCache:
+    """Cache persistente de embeddings endereçado pelo conteúdo (modelo + texto)"""
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Gera a chave do cache a partir do modelo e do texto"""
+        return hashlib.sha256(f"{model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Retorna os embeddings encontrados para as chaves informadas"""
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[start:start + _SQLITE_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+                # Marca os acertos como usados recentemente (base da evicção LRU)
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Armazena os embeddings e aplica o limite de tamanho do cache"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = [(key, array('f', vector).tobytes(), now) for key, vector in items.items()]
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self._size += len(rows)
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Remove as entradas usadas há mais tempo até voltar ao limite"""
+        # Recalcula o tamanho real, pois outros processos podem compartilhar o arquivo
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+
+        # Remove um pouco além do necessário para não evictar a cada inserção
+        excess += self.max_entries // 10
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+class QueryEmbeddingCache:
+    """LRU em memória para embeddings de consultas, compartilhado pelo processo"""
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> Tuple[str, str]:
+        """Chave (modelo, texto normalizado): espaços e caixa não mudam a consulta"""
+        normalized = ' '.join(unicodedata.normalize('NFC', text).lower().split())
+        return model_name, normalized
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        """Retorna o embedding em cache e o marca como usado recentemente"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple[str, str], vector: List[float]):
+        """Armazena o embedding, descartando os usados há mais tempo acima do limite"""
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna o tamanho do cache e a taxa de acertos"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+query_embedding_cache = QueryEmbeddingCache(int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048')))
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings que consultam o cache persistente antes de chamar o provedor"""
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache, scheduler: Optional[EmbeddingScheduler] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.scheduler = scheduler
+
+    def _embed(self, texts: List[str], priority: int) -> List[List[float]]:
+        """Chama o provedor, pelo agendador compartilhado quando houver"""
+        if self.scheduler is not None:
+            return self.scheduler.embed(texts, priority)
+        return self.embeddings.embed_documents(texts)
+
+    async def _aembed(self, texts: List[str], priority: int) -> List[List[float]]:
+        if self.scheduler is not None:
+            return await self.scheduler.aembed(texts, priority)
+        return await self.embeddings.aembed_documents(texts)
+
+    def _missing(self, keys: List[str], texts: List[str], vectors: Dict[str, List[float]]) -> Dict[str, str]:
+        """Seleciona os textos sem embedding no cache (repetidos no lote são enviados uma única vez)"""
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        return missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings apenas para os textos que ainda não estão no cache"""
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(set(keys))
+
+        missing = self._missing(keys, texts, vectors)
+        if missing:
+            new_vectors = self._embed(list(missing.values()), BULK)
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_documents (o SQLite é acessado fora do event loop)"""
+        loop = asyncio.get_running_loop()
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        vectors = await loop.run_in_executor(None, self.cache.get_many, set(keys))
+
+        missing = self._missing(keys, texts, vectors)
+        if missing:
+            new_vectors = await self._aembed(list(missing.values()), BULK)
+            computed = dict(zip(missing.keys(), new_vectors))
+            await loop.run_in_executor(None, self.cache.put_many, computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera o embedding de uma consulta (consultas repetidas vêm do LRU em memória)"""
+        key = query_embedding_cache.make_key(self.model_name, text)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = self._embed([text], INTERACTIVE)[0]
+            query_embedding_cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Gera o embedding de uma consulta sem bloquear o event loop"""
+        key = query_embedding_cache.make_key(self.model_name, text)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = (await self._aembed([text], INTERACTIVE))[0]
+            query_embedding_cache.put(key, vector)
+        return vector
+
+_cache: Optional[EmbeddingCache] = None
+_providers: Dict[str, Embeddings] = {}
+_schedulers: Dict[str, EmbeddingScheduler] = {}
+_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Retorna o cache de embeddings compartilhado pelo processo"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                path=os.getenv('EMBEDDING_CACHE_PATH', '.cache/embeddings.sqlite3'),
+                max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '50000'))
+            )
+        return _cache
+
+def get_embeddings(model_name: Optional[str] = None) -> CachedEmbeddings:
+    """Cria os embeddings OpenAI com o cache persistente na frente"""
+    model_name = model_name or os.getenv('EMBEDDING_MODEL_NAME', 'text-embedding-3-small')
+    cache = get_embedding_cache()
+
+    with _lock:
+        if model_name not in _providers:
+            _providers[model_name] = OpenAIEmbeddings(model=model_name)
+            # Um agendador por modelo agrupa as chamadas de todas as sessões do processo
+            if os.getenv('EMBEDDING_SCHEDULER_ENABLED', 'true').lower() == 'true':
+                _schedulers[model_name] = EmbeddingScheduler(_providers[model_name])
+        provider = _providers[model_name]
+        scheduler = _schedulers.get(model_name)
+
+    return CachedEmbeddings(provider, model_name, cache, scheduler)
+
+def embedding_scheduler_stats() -> Dict[str, Any]:
+    """Métricas dos agendadores de embeddings, por modelo"""
+    with _lock:
+        schedulers = dict(_schedulers)
+    return {model_name: scheduler.stats() for model_name, scheduler in schedulers.items()}
@@ -0,0 +1,207 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Prioridades: consultas interativas passam na frente da indexação em lote
+INTERACTIVE = 0
+BULK = 1
+
+class _Request:
+    __slots__ = ('texts', 'future')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+def _is_rate_limit(error: Exception) -> bool:
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 429 or 'RateLimit' in type(error).__name__
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class EmbeddingScheduler:
+    """Agrupa pedidos de embedding de várias sessões em lotes compartilhados
+
+    Um despachante junta os pedidos que chegam dentro de uma janela curta, limita
+    as chamadas simultâneas ao provedor, atende antes as consultas interativas e
+    repete os lotes com backoff exponencial quando o provedor devolve 429.
+    """
+    def __init__(self,
+                 embeddings: Embeddings,
+                 window: Optional[float] = None,
+                 max_batch: Optional[int] = None,
+                 max_in_flight: Optional[int] = None,
+                 max_retries: Optional[int] = None):
+        self.embeddings = embeddings
+        self.window = window if window is not None else float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', '10')) / 1000
+        self.max_batch = max_batch or int(os.getenv('EMBEDDING_BATCH_MAX_TEXTS', '256'))
+        self.max_in_flight = max_in_flight or int(os.getenv('EMBEDDING_MAX_IN_FLIGHT', '4'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('EMBEDDING_MAX_RETRIES', '5'))
+        self._queues: Dict[int, Deque[_Request]] = {INTERACTIVE: deque(), BULK: deque()}
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='embedding-batch')
+        self._dispatcher: Optional[threading.Thread] = None
+        self.counters = {'requests': 0, 'texts': 0, 'batches': 0, 'rate_limited': 0, 'errors': 0}
+
+    def submit(self, texts: List[str], priority: int = BULK) -> Future:
+        """Enfileira os textos e retorna um Future com os embeddings na mesma ordem"""
+        if not texts:
+            future: Future = Future()
+            future.set_result([])
+            return future
+
+        # Pedidos grandes são divididos para que consultas possam ser intercaladas
+        requests = [_Request(texts[start:start + self.max_batch]) for start in range(0, len(texts), self.max_batch)]
+        with self._condition:
+            self._ensure_dispatcher()
+            self._queues[priority].extend(requests)
+            self.counters['requests'] += 1
+            self.counters['texts'] += len(texts)
+            self._condition.notify()
+
+        if len(requests) == 1:
+            return requests[0].future
+        return self._gather(requests)
+
+    @staticmethod
+    def _gather(requests: List[_Request]) -> Future:
+        combined: Future = Future()
+        remaining = [len(requests)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] or not combined.set_running_or_notify_cancel():
+                    return
+            errors = [request.future.exception() for request in requests if request.future.exception()]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result([vector for request in requests for vector in request.future.result()])
+
+        def cancel(_):
+            if combined.cancelled():
+                for request in requests:
+                    request.future.cancel()
+
+        for request in requests:
+            request.future.add_done_callback(done)
+        combined.add_done_callback(cancel)
+        return combined
+
+    def embed(self, texts: List[str], priority: int = BULK) -> List[List[float]]:
+        """Versão bloqueante de submit"""
+        return self.submit(texts, priority).result()
+
+    async def aembed(self, texts: List[str], priority: int = INTERACTIVE) -> List[List[float]]:
+        """Versão assíncrona de submit"""
+        return await asyncio.wrap_future(self.submit(texts, priority))
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='embedding-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _pending(self) -> int:
+        return sum(len(request.texts) for queue in self._queues.values() for request in queue)
+
+    def _take_batch(self) -> List[_Request]:
+        """Retira os pedidos do próximo lote, interativos primeiro"""
+        batch: List[_Request] = []
+        size = 0
+        for priority in (INTERACTIVE, BULK):
+            queue = self._queues[priority]
+            while queue and size + len(queue[0].texts) <= self.max_batch:
+                request = queue.popleft()
+                # Marca o pedido como em execução; os já cancelados (cliente desconectou) ficam de fora
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                batch.append(request)
+                size += len(request.texts)
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            # Reserva a vaga antes de montar o lote: o que chegar enquanto o provedor está ocupado
+            # ainda é ordenado por prioridade
+            self._slots.acquire()
+            with self._condition:
+                while not any(self._queues.values()):
+                    self._condition.wait()
+
+                # Espera a janela para juntar pedidos de outras sessões, a menos que o lote já esteja cheio
+                deadline = time.monotonic() + self.window
+                while self._pending() < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._take_batch()
+
+            if not batch:
+                self._slots.release()
+                continue
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[_Request]):
+        try:
+            texts = [text for request in batch for text in request.texts]
+            vectors = self._call_with_backoff(texts)
+            self._count('batches')
+        except Exception as e:
+            self._count('errors')
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def _call_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not _is_rate_limit(e) or attempt >= self.max_retries:
+                    raise
+                self._count('rate_limited')
+                delay = _retry_after(e) or min(30.0, 0.5 * 2 ** attempt) * (1 + random.random() / 2)
+                logger.warning("Limite de taxa de embeddings atingido; nova tentativa em %.1fs", delay)
+                time.sleep(delay)
+                attempt += 1
+
+    def _count(self, counter: str):
+        with self._condition:
+            self.counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'window_ms': round(self.window * 1000, 1),
+                'max_batch': self.max_batch,
+                'max_in_flight': self.max_in_flight,
+                'queued_interactive': len(self._queues[INTERACTIVE]),
+                'queued_bulk': len(self._queues[BULK]),
+                **self.counters
+            }
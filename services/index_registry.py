@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain.schema import Document
+from services.lexical_index import reciprocal_rank_fusion
+from services.metadata_filter import MetadataFilter, filter_values, without_field
+from services.vector_store import similarity_search_with_score_by_vector
+
+# Pool compartilhado para as buscas paralelas entre shards
+_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('INDEX_SEARCH_WORKERS', '8')),
+    thread_name_prefix='index-search'
+)
+
+# Pool usado para construir shards de vários processing_ids em paralelo
+_build_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('INDEX_BUILD_WORKERS', '4')),
+    thread_name_prefix='index-build'
+)
+
+@dataclass
+class IndexShard:
+    """Índice vetorial de um único processing_id, compartilhado entre sessões"""
+    key: str
+    vector_store: Any
+    lexical_index: Any = None
+    refcount: int = 0
+    built_at: float = field(default_factory=time.time)
+
+class IndexRegistry:
+    """Mantém um shard por processing_id, construído uma vez e contado por referência"""
+    def __init__(self, max_idle: int = 16):
+        self.max_idle = max_idle
+        self._shards: Dict[str, IndexShard] = {}
+        self._building: Dict[str, Tuple[Future, List[int]]] = {}
+        self._idle: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'builds': 0, 'coalesced_builds': 0}
+
+    def acquire(self, key: str, builder: Callable[[], Any]) -> IndexShard:
+        """Retorna o shard da chave, construindo-o apenas se ainda não existir"""
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None:
+                shard.refcount += 1
+                self._idle.pop(key, None)
+                return shard
+
+            # Se outro chamador já está construindo o shard, aguarda o mesmo resultado
+            pending = self._building.get(key)
+            if pending is not None:
+                future, waiters = pending
+                waiters[0] += 1
+                self.counters['coalesced_builds'] += 1
+            else:
+                future, waiters = Future(), [0]
+                self._building[key] = (future, waiters)
+                self.counters['builds'] += 1
+
+        if pending is not None:
+            return future.result()
+
+        try:
+            built = builder()
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+
+        # O builder pode devolver só o vector store ou o shard completo (com índice BM25)
+        shard = built if isinstance(built, IndexShard) else IndexShard(key=key, vector_store=built)
+        with self._lock:
+            del self._building[key]
+            shard.refcount = 1 + waiters[0]
+            self._shards[key] = shard
+        future.set_result(shard)
+        return shard
+
+    def acquire_many(self, keys: List[str], builder_factory: Callable[[str], Callable[[], Any]]) -> List[IndexShard]:
+        """Obtém vários shards, construindo os ausentes em paralelo"""
+        keys = list(dict.fromkeys(keys))
+        if len(keys) == 1:
+            return [self.acquire(keys[0], builder_factory(keys[0]))]
+
+        futures = [_build_executor.submit(self.acquire, key, builder_factory(key)) for key in keys]
+
+        shards, error = [], None
+        for future in futures:
+            try:
+                shards.append(future.result())
+            except Exception as e:
+                error = error or e
+
+        # Em caso de falha, libera os shards que já foram obtidos
+        if error is not None:
+            for shard in shards:
+                self.release(shard.key)
+            raise error
+
+        return shards
+
+    def release(self, key: str):
+        """Libera uma referência; shards sem uso ficam ociosos até serem evictados"""
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is None:
+                return
+
+            shard.refcount -= 1
+            if shard.refcount > 0:
+                return
+
+            self._idle[key] = None
+            while len(self._idle) > self.max_idle:
+                evicted, _ = self._idle.popitem(last=False)
+                self._shards.pop(evicted, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna contadores do registro de shards"""
+        with self._lock:
+            return {
+                'shards': len(self._shards),
+                'idle': len(self._idle),
+                'building': len(self._building),
+                'references': sum(shard.refcount for shard in self._shards.values()),
+                **self.counters
+            }
+
+class ShardedVectorStore:
+    """Busca em vários shards em paralelo e combina os melhores resultados"""
+    def __init__(self, shards: List[IndexShard], embeddings):
+        self.shards = shards
+        self.embeddings = embeddings
+
+    @property
+    def has_lexical_index(self) -> bool:
+        return any(shard.lexical_index is not None for shard in self.shards)
+
+    def _select(self, filter: Optional[MetadataFilter]) -> Tuple[List[IndexShard], Optional[MetadataFilter]]:
+        """Shards dos processing_ids do filtro e o filtro restante, aplicado dentro de cada shard"""
+        if not filter or 'processing_id' not in filter:
+            return self.shards, filter or None
+        keys = {str(value) for value in filter_values(filter['processing_id'])}
+        return [shard for shard in self.shards if shard.key in keys], without_field(filter, 'processing_id')
+
+    def lexical_search_terms(self, terms: List[str], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float, int]]:
+        """Busca BM25 em todos os shards e combina os rankings por RRF
+
+        Cada shard calcula idf e tamanho médio com as próprias estatísticas, então os
+        scores BM25 de shards diferentes não são comparáveis; só as posições são.
+        """
+        shards, filter = self._select(filter)
+        shard_hits = [
+            shard.lexical_index.search_terms(terms, k, filter)
+            for shard in shards if shard.lexical_index is not None
+        ]
+        shard_hits = [hits for hits in shard_hits if hits]
+        if len(shard_hits) <= 1:
+            return shard_hits[0] if shard_hits else []
+
+        matched: Dict[str, int] = {}
+        for hits in shard_hits:
+            for doc, _, count in hits:
+                matched[doc.page_content] = max(count, matched.get(doc.page_content, 0))
+
+        fused = reciprocal_rank_fusion([[(doc, score) for doc, score, _ in hits] for hits in shard_hits])
+        # Empates de posição entre shards favorecem o documento com mais termos da consulta
+        fused.sort(key=lambda item: (item[1], matched[item[0].page_content]), reverse=True)
+        return [(doc, score, matched[doc.page_content]) for doc, score in fused[:k]]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Busca o vetor em todos os shards e retorna o top-k global"""
+        shards, filter = self._select(filter)
+        if len(shards) == 1:
+            return similarity_search_with_score_by_vector(shards[0].vector_store, embedding, k, filter)
+
+        futures = [
+            _search_executor.submit(similarity_search_with_score_by_vector, shard.vector_store, embedding, k, filter)
+            for shard in shards
+        ]
+        results = [item for future in futures for item in future.result()]
+
+        # Scores de similaridade: quanto maior, mais relevante
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    async def asimilarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Versão assíncrona: as buscas nos shards rodam no pool, fora do event loop"""
+        shards, filter = self._select(filter)
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                _search_executor,
+                partial(similarity_search_with_score_by_vector, shard.vector_store, embedding, k, filter)
+            )
+            for shard in shards
+        ]
+        results = [item for shard_results in await asyncio.gather(*futures) for item in shard_results]
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Gera o embedding da consulta de forma assíncrona e busca em todos os shards"""
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Document]:
+        """Retorna os documentos mais similares à consulta sem bloquear o event loop"""
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Gera o embedding da consulta uma única vez e busca em todos os shards"""
+        embedding = self.embeddings.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Document]:
+        """Retorna os documentos mais similares à consulta"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+# Registro compartilhado pelo processo
+index_registry = IndexRegistry(max_idle=int(os.getenv('INDEX_MAX_IDLE_SHARDS', '16')))
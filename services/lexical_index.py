@@ -0,0 +1,231 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from langchain.schema import Document
+from services.metadata_filter import MetadataFilter, normalize_filter, matches_filter
+
+_TOKEN = re.compile(r"\w+")
+
+# Palavras muito comuns que não ajudam a decidir a rota lexical
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre esta este eu foi ha isso mais mas me meu minha
+na nas no nos o os ou para pela pelo por qual quais quando que se sem ser sobre sua seu sao tem
+um uma umas uns voce voces the of and to in is are what which
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Termos em minúsculas e sem acentos"""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    return _TOKEN.findall(''.join(char for char in normalized if not unicodedata.combining(char)))
+
+def query_terms(query: str) -> List[str]:
+    """Termos distintos da consulta, sem stopwords"""
+    return list(dict.fromkeys(term for term in tokenize(query) if term not in STOPWORDS))
+
+class BM25Index:
+    """Índice invertido em memória com ranqueamento BM25
+
+    Remoções deixam a linha vazia; quando as linhas vazias passam de compact_ratio
+    do total, o índice é compactado.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.documents: List[Optional[Document]] = []
+        self._terms: List[Counter] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._id_to_row: Dict[str, int] = {}
+        self._total_length = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], ids: Optional[List[str]] = None) -> "BM25Index":
+        index = cls()
+        index.add_documents(documents, ids=ids)
+        return index
+
+    def _remove_row(self, row: int):
+        for term in self._terms[row]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths[row]
+        self._count -= 1
+        self.documents[row] = None
+        self._terms[row] = Counter()
+        self._lengths[row] = 0
+
+    def _compact(self):
+        """Remove as linhas vazias e renumera as demais"""
+        live = [row for row, document in enumerate(self.documents) if document is not None]
+        remap = {row: new_row for new_row, row in enumerate(live)}
+        self.documents = [self.documents[row] for row in live]
+        self._terms = [self._terms[row] for row in live]
+        self._lengths = [self._lengths[row] for row in live]
+        self._postings = {
+            term: {remap[row]: frequency for row, frequency in postings.items()}
+            for term, postings in self._postings.items()
+        }
+        self._id_to_row = {doc_id: remap[row] for doc_id, row in self._id_to_row.items() if row in remap}
+
+    @property
+    def tombstones(self) -> int:
+        """Linhas vazias deixadas por remoções e ainda não compactadas"""
+        return len(self.documents) - self._count
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None):
+        """Indexa os documentos (documentos com ID existente são substituídos)"""
+        ids = list(ids) if ids else [None] * len(documents)
+        with self._lock:
+            for doc_id, document in zip(ids, documents):
+                row = self._id_to_row.get(doc_id) if doc_id is not None else None
+                if row is not None and self.documents[row] is not None:
+                    self._remove_row(row)
+                if row is None:
+                    row = len(self.documents)
+                    self.documents.append(None)
+                    self._terms.append(Counter())
+                    self._lengths.append(0)
+                    if doc_id is not None:
+                        self._id_to_row[doc_id] = row
+
+                terms = Counter(tokenize(document.page_content))
+                self.documents[row] = document
+                self._terms[row] = terms
+                self._lengths[row] = sum(terms.values())
+                self._total_length += self._lengths[row]
+                self._count += 1
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[row] = frequency
+
+    def delete(self, ids: Iterable[str]):
+        """Remove os documentos pelos IDs"""
+        with self._lock:
+            for doc_id in ids:
+                row = self._id_to_row.pop(doc_id, None)
+                if row is not None and self.documents[row] is not None:
+                    self._remove_row(row)
+            if self.tombstones > self.compact_ratio * len(self.documents):
+                self._compact()
+
+    def search_terms(self, terms: Sequence[str], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float, int]]:
+        """Retorna (documento, score, termos da consulta encontrados) dos k melhores que atendem ao filtro"""
+        normalized = normalize_filter(filter)
+        with self._lock:
+            if not self._count:
+                return []
+            average_length = self._total_length / self._count
+            scores: Dict[int, float] = {}
+            matched: Counter = Counter()
+            allowed: Dict[int, bool] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (self._count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for row, frequency in postings.items():
+                    if normalized is not None:
+                        if row not in allowed:
+                            allowed[row] = matches_filter(self.documents[row].metadata, normalized)
+                        if not allowed[row]:
+                            continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / average_length)
+                    scores[row] = scores.get(row, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    matched[row] += 1
+
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            return [(self.documents[row], scores[row], matched[row]) for row in best]
+
+    def search(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Retorna os k documentos com maior score BM25"""
+        return [(doc, score) for doc, score, _ in self.search_terms(query_terms(query), k, filter)]
+
+    def __len__(self) -> int:
+        return self._count
+
+def _has_identifier(terms: Sequence[str]) -> bool:
+    return any(any(char.isdigit() for char in term) for term in terms)
+
+def strong_lexical_results(terms: Sequence[str], hits: List[Tuple[Document, float, int]], max_terms: int) -> Optional[List[Tuple[Document, float]]]:
+    """Resultados lexicais quando bastam sozinhos (None se a busca vetorial for necessária)
+
+    A rota lexical é usada quando o melhor documento contém todos os termos da
+    consulta e ela é curta ou cita um identificador (números, códigos).
+    """
+    if not terms or not hits or hits[0][2] < len(terms):
+        return None
+    if len(terms) > max_terms and not _has_identifier(terms):
+        return None
+    return [(doc, score) for doc, score, _ in hits]
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Tuple[Document, float]]], k: int = 60, limit: Optional[int] = None) -> List[Tuple[Document, float]]:
+    """Combina rankings pela soma de 1 / (k + posição)"""
+    fused: Dict[str, Tuple[Document, float]] = {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results):
+            key = doc.page_content
+            previous = fused.get(key)
+            score = 1.0 / (k + rank + 1) + (previous[1] if previous else 0.0)
+            fused[key] = (previous[0] if previous else doc, score)
+
+    ranked = sorted(fused.values(), key=lambda item: item[1], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+class RetrievalStats:
+    """Conta quantas consultas seguiram cada rota de recuperação (e quantas receberam fatos estruturados)"""
+    def __init__(self):
+        self.counters = {'lexical': 0, 'hybrid': 0, 'vector': 0, 'structured': 0}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str):
+        with self._lock:
+            self.counters[mode] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+retrieval_stats = RetrievalStats()
+
+async def hybrid_search(
+    query: str,
+    k: int,
+    lexical_search: Optional[Callable[[List[str], int], List[Tuple[Document, float, int]]]],
+    vector_search: Callable[[int], Awaitable[Tuple[List[float], List[Tuple[Document, float]]]]],
+    min_score: float
+) -> Tuple[List[Tuple[Document, float]], Optional[List[float]], str]:
+    """Busca lexical, vetorial ou híbrida (RRF); retorna resultados, embedding da consulta e a rota
+
+    Os resultados vetoriais abaixo de min_score são descartados antes da fusão, pois
+    os scores combinados não estão na mesma escala da similaridade de cosseno.
+    """
+    hits: List[Tuple[Document, float, int]] = []
+    terms = query_terms(query)
+    if lexical_search is not None:
+        hits = lexical_search(terms, k)
+        # LEXICAL_ROUTING=off desliga só o atalho lexical; a fusão com a busca vetorial continua
+        routing = os.getenv('LEXICAL_ROUTING', 'auto').lower() != 'off'
+        strong = strong_lexical_results(terms, hits, int(os.getenv('LEXICAL_MAX_TERMS', '3'))) if routing else None
+        if strong is not None:
+            # Consulta essencialmente lexical: dispensa a chamada de embedding
+            retrieval_stats.record('lexical')
+            return strong, None, 'lexical'
+
+    query_embedding, vector_results = await vector_search(k)
+    vector_results = [(doc, score) for doc, score in vector_results if score >= min_score]
+    if not hits:
+        retrieval_stats.record('vector')
+        return vector_results, query_embedding, 'vector'
+
+    retrieval_stats.record('hybrid')
+    lexical_results = [(doc, score) for doc, score, _ in hits]
+    return reciprocal_rank_fusion([vector_results, lexical_results], limit=k), query_embedding, 'hybrid'
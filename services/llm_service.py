@@ -0,0 +1,140 @@
+import os
+import json
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+from groq import AsyncGroq
+from services.completion_cache import completion_cache
+from services.context_builder import estimate_tokens, prompt_token_stats
+
+_async_client: Optional[AsyncGroq] = None
+_lock = threading.Lock()
+
+def get_async_groq_client() -> AsyncGroq:
+    """Retorna o cliente assíncrono da Groq compartilhado pelo processo"""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncGroq(api_key=os.getenv('GROQ_API_KEY'))
+        return _async_client
+
+# Parâmetros de amostragem usados em todas as chamadas (também fazem parte da chave do cache)
+SAMPLING_PARAMS = {
+    "temperature": 0.6,
+    "max_completion_tokens": 1024,
+    "top_p": 0.95,
+    "reasoning_format": "hidden"
+}
+
+# Um prompt pode ser um texto único ou a lista de mensagens do chat
+Prompt = Union[str, List[Dict[str, str]]]
+
+def _as_messages(prompt: Prompt) -> List[Dict[str, str]]:
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+def _estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+async def _cached_completion(key: str) -> Optional[str]:
+    """Consulta o cache de completions (a camada em disco é lida fora do event loop)"""
+    if completion_cache.disk is None:
+        return completion_cache.get(key)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, completion_cache.get, key)
+
+async def _store_completion(key: str, response: str):
+    if completion_cache.disk is None:
+        completion_cache.put(key, response)
+        return
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, completion_cache.put, key, response)
+
+async def get_groq_response(client: AsyncGroq, prompt: Prompt) -> str:
+    """Get response from Groq model"""
+    model = os.getenv('GROQ_MODEL_NAME', 'deepseek-r1-distill-llama-70b')
+    messages = _as_messages(prompt)
+    
+    # Prompts idênticos (ex.: reenvios do front-end) reaproveitam a resposta anterior
+    key = completion_cache.make_key(model, messages, SAMPLING_PARAMS)
+    cached = await _cached_completion(key)
+    if cached is not None:
+        return cached
+
+    completion = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=False,
+        **SAMPLING_PARAMS
+    )
+
+    usage = getattr(completion, 'usage', None)
+    prompt_token_stats.record(_estimate_prompt_tokens(messages), getattr(usage, 'prompt_tokens', None))
+
+    response = completion.choices[0].message.content
+    await _store_completion(key, response)
+    return response
+
+async def stream_groq_response(client: AsyncGroq, prompt: Prompt) -> AsyncIterator[str]:
+    """Stream response tokens from Groq model as they arrive"""
+    model = os.getenv('GROQ_MODEL_NAME', 'deepseek-r1-distill-llama-70b')
+    messages = _as_messages(prompt)
+
+    key = completion_cache.make_key(model, messages, SAMPLING_PARAMS)
+    cached = await _cached_completion(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        **SAMPLING_PARAMS
+    )
+
+    parts: List[str] = []
+    prompt_tokens = None
+    async for chunk in stream:
+        # A Groq informa o uso no último chunk do stream (x_groq.usage)
+        usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            parts.append(token)
+            yield token
+
+    prompt_token_stats.record(_estimate_prompt_tokens(messages), prompt_tokens)
+
+    # Só armazena respostas cujo stream terminou por completo
+    await _store_completion(key, "".join(parts))
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formata um evento Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+async def sse_stream(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Converte um stream de tokens em eventos SSE, encerrando com a resposta completa"""
+    parts: List[str] = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event({"token": token})
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+        return
+
+    yield sse_event({"response": "".join(parts)}, event="done")
+
+# Cabeçalhos para evitar buffering de proxies nas respostas SSE
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
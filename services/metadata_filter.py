@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+# Filtro por metadados: campo -> valor ou lista de valores aceitos (E entre campos, OU entre valores)
+MetadataFilter = Dict[str, Any]
+
+# Campos com índice de payload nos backends vetoriais
+PAYLOAD_INDEX_FIELDS = ('type', 'id', 'project_id', 'processing_id')
+
+def filter_values(value: Any) -> List[Any]:
+    """Valores aceitos de um campo do filtro"""
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+def normalize_filter(filter: Optional[Mapping[str, Any]]) -> Optional[Dict[str, Set[str]]]:
+    """Filtro com os valores como texto (1 e "1" são equivalentes); None se vazio"""
+    if not filter:
+        return None
+    return {field: {str(value) for value in filter_values(values)} for field, values in filter.items()}
+
+def matches_filter(metadata: Mapping[str, Any], filter: Optional[Dict[str, Set[str]]]) -> bool:
+    """Verifica os metadados contra um filtro normalizado"""
+    if not filter:
+        return True
+    return all(field in metadata and str(metadata[field]) in values for field, values in filter.items())
+
+def without_field(filter: Optional[Mapping[str, Any]], field: str) -> Optional[MetadataFilter]:
+    """Cópia do filtro sem um campo (None se não sobrar nenhum)"""
+    if not filter:
+        return None
+    remaining = {key: value for key, value in filter.items() if key != field}
+    return remaining or None
+
+def _variants(value: Any) -> Iterable[Any]:
+    """Formas do valor no payload: o Qdrant diferencia 1 de "1" """
+    yield str(value)
+    if isinstance(value, bool):
+        return
+    text = str(value)
+    if text.lstrip('-').isdigit():
+        yield int(text)
+
+def qdrant_filter(filter: Optional[Mapping[str, Any]], metadata_key: str = 'metadata'):
+    """Converte o filtro para o formato do Qdrant"""
+    if not filter:
+        return None
+
+    from qdrant_client.http import models as rest
+    return rest.Filter(must=[
+        rest.Filter(should=[
+            rest.FieldCondition(key=f"{metadata_key}.{field}", match=rest.MatchValue(value=variant))
+            for value in filter_values(values)
+            for variant in dict.fromkeys(_variants(value))
+        ])
+        for field, values in filter.items()
+    ])
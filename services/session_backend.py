@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+# Campo do registro com a revisão gravada por SessionStore.save
+REVISION_KEY = '_revision'
+
+class SessionBackend(ABC):
+    """Armazenamento compartilhado do estado das sessões entre processos"""
+    @abstractmethod
+    def save(self, key: str, record: Dict[str, Any]):
+        """Grava (ou substitui) o estado da sessão"""
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado da sessão, ou None se não existir"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove o estado da sessão"""
+
+    def load_revision(self, key: str) -> Optional[str]:
+        """Revisão do estado salvo (backends podem evitar ler o registro inteiro)"""
+        record = self.load(key)
+        return record.get(REVISION_KEY) if record is not None else None
+
+class NullSessionBackend(SessionBackend):
+    """Backend que não persiste nada (sessões ficam apenas no processo)"""
+    def save(self, key: str, record: Dict[str, Any]):
+        pass
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def delete(self, key: str):
+        pass
+
+class SQLiteSessionBackend(SessionBackend):
+    """Backend local em SQLite, compartilhado pelos workers da mesma máquina"""
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def save(self, key: str, record: Dict[str, Any]):
+        """Grava (ou substitui) o estado da sessão"""
+        now = time.time()
+        payload = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, record, updated_at) VALUES (?, ?, ?)",
+                (key, payload, now)
+            )
+            # Remove de tempos em tempos as sessões abandonadas
+            if self.ttl > 0 and now - self._last_purge > 60:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+                self._last_purge = now
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado da sessão, se existir e não tiver expirado"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, updated_at FROM sessions WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+        if row is None or (self.ttl > 0 and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def load_revision(self, key: str) -> Optional[str]:
+        """Lê só a revisão do registro, sem desserializar o estado inteiro"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT json_extract(record, ?), updated_at FROM sessions WHERE key = ?",
+                (f"$.{REVISION_KEY}", key)
+            ).fetchone()
+
+        if row is None or (self.ttl > 0 and time.time() - row[1] > self.ttl):
+            return None
+        return row[0]
+
+    def delete(self, key: str):
+        """Remove o estado da sessão"""
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+_backend: Optional[SessionBackend] = None
+_lock = threading.Lock()
+
+def _create_backend() -> SessionBackend:
+    name = os.getenv('SESSION_BACKEND', 'sqlite')
+    if name == 'none':
+        return NullSessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend(
+            os.getenv('SESSION_BACKEND_PATH', '.cache/sessions.sqlite3'),
+            ttl=float(os.getenv('SESSION_BACKEND_TTL', '86400'))
+        )
+
+    # Backends externos (ex.: Redis) são informados como "modulo:Classe"
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"SESSION_BACKEND inválido: {name}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+def get_session_backend() -> SessionBackend:
+    """Retorna o backend de sessões configurado por SESSION_BACKEND"""
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return _backend
@@ -0,0 +1,298 @@
+import os
+import time
+import asyncio
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from services.session_backend import REVISION_KEY, SessionBackend, NullSessionBackend, get_session_backend
+
+# Estimativa usada para objetos que não informam o próprio tamanho
+DEFAULT_SESSION_BYTES = 64 * 1024
+
+# Chave do registro provisório de uma sessão que ainda está sendo construída
+PENDING_KEY = '_pending'
+
+def estimate_session_bytes(session: Any) -> int:
+    """Estimativa aproximada da memória ocupada por uma sessão"""
+    estimate = getattr(session, 'estimate_size', None)
+    if estimate is None:
+        return DEFAULT_SESSION_BYTES
+    try:
+        return int(estimate())
+    except Exception:
+        return DEFAULT_SESSION_BYTES
+
+class SessionStore:
+    """Armazena sessões ativas com limite de quantidade, orçamento de memória e TTL ocioso
+
+    Com `restore`, o estado das sessões também é gravado no backend compartilhado
+    e qualquer worker consegue reidratar uma sessão criada por outro. Cada gravação
+    leva uma revisão nova; `refresh` recarrega a sessão em memória quando outro
+    worker gravou uma revisão mais recente.
+    """
+    def __init__(self,
+                 max_sessions: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 idle_ttl: Optional[float] = None,
+                 restore: Optional[Callable[..., Any]] = None,
+                 namespace: str = 'session',
+                 backend: Optional[SessionBackend] = None):
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_MAX_COUNT', '200'))
+        self.max_bytes = max_bytes or int(float(os.getenv('SESSION_MAX_MEMORY_MB', '512')) * 1024 * 1024)
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv('SESSION_IDLE_TTL', '3600'))
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        # Revisão do backend que corresponde a cada sessão em memória
+        self._revisions: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = 0.0
+        self.restore = restore
+        self.namespace = namespace
+        self.pending_ttl = float(os.getenv('SESSION_PENDING_TTL', '600'))
+        self._backend = backend
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evicted_capacity': 0,
+            'evicted_memory': 0,
+            'evicted_idle': 0,
+            'rehydrated': 0,
+            'reloaded': 0
+        }
+
+    @property
+    def backend(self) -> SessionBackend:
+        # Criado sob demanda para não abrir o SQLite na importação
+        if self._backend is None:
+            self._backend = get_session_backend() if self.restore else NullSessionBackend()
+        return self._backend
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.namespace}:{session_id}"
+
+    def _expired(self, session_id: str, now: float) -> bool:
+        return self.idle_ttl > 0 and now - self._last_access.get(session_id, now) > self.idle_ttl
+
+    def _evict(self, session_id: str, reason: str):
+        """Remove a sessão e libera seus recursos"""
+        session = self._sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._revisions.pop(session_id, None)
+        self.counters[f'evicted_{reason}'] += 1
+        close = getattr(session, 'close', None)
+        if close is not None:
+            close()
+
+    def sweep(self):
+        """Remove sessões ociosas além do TTL"""
+        now = time.time()
+        with self._lock:
+            self._last_sweep = now
+            # A ordem LRU garante que as mais antigas estão no início
+            for session_id in list(self._sessions):
+                if not self._expired(session_id, now):
+                    break
+                self._evict(session_id, 'idle')
+
+    def _maybe_sweep(self):
+        if time.time() - self._last_sweep > min(self.idle_ttl, 60) > 0:
+            self.sweep()
+
+    def _enforce_limits(self):
+        """Evicta pelo uso menos recente até respeitar quantidade e memória"""
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)), 'capacity')
+
+        total = sum(estimate_session_bytes(session) for session in self._sessions.values())
+        while total > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            total -= estimate_session_bytes(self._sessions[session_id])
+            self._evict(session_id, 'memory')
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._maybe_sweep()
+            if session_id in self._sessions and self._expired(session_id, time.time()):
+                self._evict(session_id, 'idle')
+            return session_id in self._sessions
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """Retorna a sessão e a marca como usada recentemente"""
+        with self._lock:
+            if session_id not in self:
+                self.counters['misses'] += 1
+                return default
+            self.counters['hits'] += 1
+            self._sessions.move_to_end(session_id)
+            self._last_access[session_id] = time.time()
+            return self._sessions[session_id]
+
+    def __getitem__(self, session_id: str) -> Any:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Any):
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None and previous is not session:
+                close = getattr(previous, 'close', None)
+                if close is not None:
+                    close()
+            self._sessions[session_id] = session
+            self._last_access[session_id] = time.time()
+            self._maybe_sweep()
+            self._enforce_limits()
+
+    def pop(self, session_id: str, default: Any = None) -> Any:
+        """Remove a sessão sem liberar seus recursos (fica a cargo de quem chamou)"""
+        with self._lock:
+            self._last_access.pop(session_id, None)
+            self._revisions.pop(session_id, None)
+            return self._sessions.pop(session_id, default)
+
+    def __delitem__(self, session_id: str):
+        if self.pop(session_id) is None:
+            raise KeyError(session_id)
+
+    def _pending_since(self, record: Optional[Dict[str, Any]]) -> Optional[float]:
+        """Início da construção, se o registro for apenas o marcador de sessão em preparação"""
+        if record is None or PENDING_KEY not in record:
+            return None
+        return float(record[PENDING_KEY])
+
+    def load_record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Estado salvo da sessão no backend compartilhado (None se não houver ou se ainda estiver em preparação)"""
+        if self.restore is None:
+            return None
+        record = self.backend.load(self._key(session_id))
+        if record is None or self._pending_since(record) is not None:
+            return None
+        self.counters['rehydrated'] += 1
+        if record.get(REVISION_KEY):
+            self._revisions[session_id] = record[REVISION_KEY]
+        return record
+
+    async def refresh(self, session_id: str, session: Any) -> Any:
+        """Recarrega a sessão em memória se outro worker gravou uma revisão mais recente"""
+        if self.restore is None:
+            return session
+        key = self._key(session_id)
+
+        def reload() -> Any:
+            revision = self.backend.load_revision(key)
+            if not revision or revision == self._revisions.get(session_id):
+                return session
+            record = self.backend.load(key)
+            if record is None or record.get(REVISION_KEY) != revision:
+                return session
+
+            # Sessões com apply_record são atualizadas no lugar (o índice já construído é mantido)
+            apply_record = getattr(session, 'apply_record', None)
+            if apply_record is not None:
+                apply_record(record)
+                current = session
+            else:
+                current = self.restore(record)
+                self[session_id] = current
+            self._revisions[session_id] = revision
+            self.counters['reloaded'] += 1
+            return current
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, reload)
+
+    async def record_status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Indica se outro worker salvou a sessão ('stored') ou ainda a está construindo ('pending')"""
+        if self.restore is None:
+            return None
+        loop = asyncio.get_running_loop()
+        record = await loop.run_in_executor(None, self.backend.load, self._key(session_id))
+        if record is None:
+            return None
+        started_at = self._pending_since(record)
+        if started_at is None:
+            return {'status': 'stored'}
+        # Um marcador antigo demais indica que o worker que construía a sessão caiu
+        if self.pending_ttl > 0 and time.time() - started_at > self.pending_ttl:
+            return None
+        return {'status': 'pending', 'started_at': started_at}
+
+    async def mark_pending(self, session_id: str):
+        """Registra no backend que a sessão está sendo construída, para os demais workers"""
+        if self.restore is None:
+            return
+        key = self._key(session_id)
+
+        def mark():
+            if self.backend.load(key) is None:
+                self.backend.save(key, {PENDING_KEY: time.time()})
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, mark)
+
+    async def clear_pending(self, session_id: str):
+        """Remove o marcador de sessão em preparação (o estado salvo, se houver, é mantido)"""
+        if self.restore is None:
+            return
+        key = self._key(session_id)
+
+        def clear():
+            if self._pending_since(self.backend.load(key)) is not None:
+                self.backend.delete(key)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, clear)
+
+    async def save(self, session_id: str, session: Any = None):
+        """Grava o estado da sessão no backend compartilhado"""
+        session = session if session is not None else self._sessions.get(session_id)
+        to_record = getattr(session, 'to_record', None)
+        if to_record is None or self.restore is None:
+            return
+
+        # O snapshot é feito no event loop para não disputar com outras mensagens
+        record = to_record()
+        revision = record[REVISION_KEY] = uuid.uuid4().hex
+        key = self._key(session_id)
+
+        def write():
+            self.backend.save(key, record)
+            # Só depois de gravada a revisão passa a ser a da sessão em memória
+            self._revisions[session_id] = revision
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, write)
+
+    async def persist_after(self, session_id: str, session: Any, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Repassa os tokens e grava a sessão quando o stream termina"""
+        async for token in tokens:
+            yield token
+        await self.save(session_id, session)
+
+    async def discard(self, session_id: str):
+        """Encerra a sessão neste worker e remove seu estado compartilhado"""
+        session = self.pop(session_id)
+        close = getattr(session, 'close', None)
+        if close is not None:
+            close()
+        if self.restore is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.backend.delete, self._key(session_id))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores de uso e evicção"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'estimated_bytes': sum(estimate_session_bytes(session) for session in self._sessions.values()),
+                'max_bytes': self.max_bytes,
+                'idle_ttl': self.idle_ttl,
+                **self.counters
+            }
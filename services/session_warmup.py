@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+import weakref
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from services.session_store import SessionStore
+from services.single_flight import SingleFlight
+
+class SessionNotReady(Exception):
+    """A sessão ainda está sendo construída"""
+    def __init__(self, progress: "WarmupProgress"):
+        super().__init__("Sessão ainda em preparação")
+        self.progress = progress
+
+class WarmupProgress:
+    """Progresso da construção de uma sessão em segundo plano"""
+    def __init__(self):
+        self.status = 'pending'
+        self.chunks_loaded = 0
+        self.chunks_embedded = 0
+        self.chunks_indexed = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancelled = False
+        self.task: Optional[asyncio.Future] = None
+        self._lock = threading.Lock()
+
+    def loaded(self, count: int):
+        with self._lock:
+            self.status = 'loading'
+            self.chunks_loaded += count
+
+    def embedded(self, count: int):
+        with self._lock:
+            self.chunks_embedded += count
+
+    def indexed(self, count: int):
+        with self._lock:
+            self.chunks_indexed += count
+
+    def finish(self, error: Optional[Exception] = None):
+        self.finished_at = time.time()
+        if error is None:
+            self.status = 'ready'
+        else:
+            self.status = 'failed'
+            self.error = str(error)
+
+    @classmethod
+    def remote(cls, started_at: float) -> "WarmupProgress":
+        """Progresso de uma construção feita por outro worker (só o início é conhecido)"""
+        progress = cls()
+        progress.started_at = started_at
+        return progress
+
+    def track(self, embeddings: Embeddings) -> Embeddings:
+        """Envolve os embeddings para contar os chunks embedados"""
+        return ProgressEmbeddings(embeddings, self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            'status': self.status,
+            'chunks_loaded': self.chunks_loaded,
+            'chunks_embedded': self.chunks_embedded,
+            'chunks_indexed': self.chunks_indexed,
+            'elapsed': round(end - self.started_at, 3),
+            'error': self.error
+        }
+
+class ProgressEmbeddings(Embeddings):
+    """Embeddings que informam ao progresso quantos documentos foram embedados"""
+    def __init__(self, embeddings: Embeddings, progress: WarmupProgress):
+        self.embeddings = embeddings
+        self.progress = progress
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.embeddings.embed_documents(texts)
+        self.progress.embedded(len(texts))
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = await self.embeddings.aembed_documents(texts)
+        self.progress.embedded(len(texts))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+class SessionWarmup:
+    """Constrói as sessões em segundo plano, liberando a requisição de criação"""
+    def __init__(self, store: SessionStore, wait_timeout: Optional[float] = None):
+        self.store = store
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv('SESSION_WARMUP_WAIT', '30'))
+        self._builds: Dict[str, WarmupProgress] = {}
+        # Pedidos concorrentes para a mesma sessão aguardam uma única construção
+        self._flight = SingleFlight()
+        # Serializa a gravação da sessão construída e o seu encerramento
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.counters = {'failed': 0}
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    def start(self, session_id: str, factory: Optional[Callable[[WarmupProgress], Any]] = None) -> WarmupProgress:
+        """Inicia a construção da sessão ou reaproveita a que já está em andamento"""
+        task = self._flight.in_flight(session_id)
+        if task is None or task.done():
+            self._flight.forget(session_id)
+            self._builds[session_id] = WarmupProgress()
+        progress = self._builds.setdefault(session_id, WarmupProgress())
+        progress.task = self._flight.start(session_id, lambda: self._run(session_id, factory, progress))
+        return progress
+
+    async def create(self, session_id: str, factory: Callable[[WarmupProgress], Any]) -> WarmupProgress:
+        """Inicia a construção de uma sessão nova, avisando os demais workers de que ela está em preparação"""
+        if self._flight.in_flight(session_id) is None:
+            await self.store.mark_pending(session_id)
+        return self.start(session_id, factory)
+
+    async def _run(self, session_id: str, factory: Optional[Callable[[WarmupProgress], Any]], progress: WarmupProgress):
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                # Uma sessão criada por outro worker é reidratada em vez de recriada
+                record = await loop.run_in_executor(None, self.store.load_record, session_id)
+                if record is not None:
+                    session = await loop.run_in_executor(None, self.store.restore, record, progress)
+                elif factory is not None:
+                    session = await loop.run_in_executor(None, factory, progress)
+                else:
+                    raise KeyError(session_id)
+            except Exception as e:
+                progress.finish(e)
+                self.counters['failed'] += 1
+                await self.store.clear_pending(session_id)
+                return
+
+            async with self._session_lock(session_id):
+                if progress.cancelled:
+                    # A sessão foi encerrada enquanto era construída
+                    close = getattr(session, 'close', None)
+                    if close is not None:
+                        close()
+                    return
+
+                self.store[session_id] = session
+                try:
+                    await self.store.save(session_id, session)
+                finally:
+                    progress.finish()
+        finally:
+            # A construção sai da lista em qualquer desfecho (pronta, com erro ou cancelada)
+            if self._builds.get(session_id) is progress:
+                del self._builds[session_id]
+
+    async def get(self, session_id: str) -> Any:
+        """Retorna a sessão pronta, aguardando (até wait_timeout) a construção em andamento"""
+        session = self.store.get(session_id)
+        if session is not None:
+            # Outro worker pode ter gravado histórico ou dados mais recentes
+            return await self.store.refresh(session_id, session)
+
+        progress = self._builds.get(session_id)
+        if progress is None:
+            # Sessão desconhecida neste worker: tenta reidratá-la do backend compartilhado
+            record = await self.store.record_status(session_id)
+            if record is None:
+                return None
+            if record['status'] == 'pending':
+                # Outro worker ainda está construindo a sessão
+                raise SessionNotReady(WarmupProgress.remote(record['started_at']))
+            progress = self.start(session_id)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(progress.task), self.wait_timeout)
+        except asyncio.TimeoutError:
+            raise SessionNotReady(progress)
+
+        if progress.status == 'failed':
+            raise RuntimeError(progress.error)
+        return self.store.get(session_id)
+
+    async def status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Estado da sessão: progresso da construção, pronta ou None se desconhecida"""
+        progress = self._builds.get(session_id)
+        if progress is not None:
+            return progress.to_dict()
+        session = self.store.get(session_id)
+        if session is not None:
+            progress = getattr(session, 'progress', None)
+            return progress.to_dict() if progress is not None else {'status': 'ready'}
+        record = await self.store.record_status(session_id)
+        if record is None:
+            return None
+        if record['status'] == 'pending':
+            return WarmupProgress.remote(record['started_at']).to_dict()
+        return {'status': 'stored'}
+
+    async def discard(self, session_id: str):
+        """Encerra a sessão, cancelando a construção em andamento"""
+        progress = self._builds.pop(session_id, None)
+        if progress is not None:
+            progress.cancelled = True
+        self._flight.forget(session_id)
+        # Aguarda a gravação em andamento, para que ela não recrie o registro já removido
+        async with self._session_lock(session_id):
+            await self.store.discard(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna as construções em andamento, as que falharam e quantos pedidos foram agrupados"""
+        return {
+            **self.counters,
+            **self._flight.stats()
+        }
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    """Agrupa chamadas assíncronas concorrentes com a mesma chave em uma única execução"""
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {'calls': 0, 'coalesced': 0}
+
+    def in_flight(self, key: Hashable) -> Optional[asyncio.Future]:
+        """Retorna a execução em andamento para a chave, se houver"""
+        return self._calls.get(key)
+
+    def start(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Inicia a execução ou retorna a que já está em andamento para a chave"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.counters['coalesced'] += 1
+            return task
+
+        self.counters['calls'] += 1
+        task = asyncio.ensure_future(factory())
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return task
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def forget(self, key: Hashable):
+        """Desassocia a execução em andamento; a próxima chamada inicia uma nova"""
+        self._calls.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {'in_flight': len(self._calls), **self.counters}
@@ -0,0 +1,193 @@
+import os
+import re
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from services.lexical_index import tokenize
+
+# Campos com índice por valor
+FIELDS = ('status', 'priority', 'due_date', 'project_id')
+
+# Prefixos de status que indicam item encerrado (não conta como atrasado)
+_DONE_STATUS = ('conclu', 'feit', 'finaliz', 'encerr', 'fechad', 'entreg', 'cancel', 'done', 'complet', 'closed')
+# Radicais em português casam por prefixo; termos em inglês só como palavra inteira ("later" não é atraso)
+_OVERDUE_STEMS = ('atrasad', 'vencid')
+_OVERDUE_WORDS = frozenset(('overdue', 'late'))
+_COUNT = ('quant', 'numero', 'total', 'many', 'count')
+_PROJECT_REF = re.compile(r"\bprojeto (?:numero |n |id )?(\w+)")
+_FIELD_NAMES = {'status': 'status', 'priority': 'prioridade', 'project_id': 'projeto'}
+
+def normalize(value: Any) -> str:
+    """Valor em minúsculas, sem acentos e com espaços simples"""
+    return ' '.join(tokenize(str(value)))
+
+def _parse_date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+class RecordTable:
+    """Tabela colunar em memória de registros estruturados, com índice por valor dos campos"""
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.ids: List[str] = []
+        self.labels: List[str] = []
+        self.columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        self.index: Dict[str, Dict[str, Set[int]]] = {field: {} for field in FIELDS}
+        self.raw_values: Dict[str, Dict[str, Any]] = {field: {} for field in FIELDS}
+        open_due: List[Tuple[date, int]] = []
+
+        for row, record in enumerate(records):
+            self.ids.append(str(record.get('id', row + 1)))
+            self.labels.append(str(record.get('title') or record.get('name') or ''))
+            for field in FIELDS:
+                value = record.get(field)
+                if field == 'due_date' and value is None:
+                    value = record.get('deadline')
+                self.columns[field].append(value)
+                if value is not None:
+                    key = normalize(value)
+                    self.index[field].setdefault(key, set()).add(row)
+                    self.raw_values[field].setdefault(key, value)
+
+            due = _parse_date(self.columns['due_date'][row]) if self.columns['due_date'][row] else None
+            if due is not None and not normalize(self.columns['status'][row] or '').startswith(_DONE_STATUS):
+                open_due.append((due, row))
+
+        # Vencimentos dos itens em aberto, ordenados para busca binária
+        open_due.sort()
+        self._open_due_dates = [due for due, _ in open_due]
+        self._open_due_rows = [row for _, row in open_due]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_where(self, field: str, values: Iterable[str]) -> Set[int]:
+        """Linhas cujo campo tem algum dos valores (normalizados)"""
+        rows: Set[int] = set()
+        for value in values:
+            rows |= self.index[field].get(value, set())
+        return rows
+
+    def overdue_rows(self, today: date) -> Set[int]:
+        """Linhas vencidas antes de hoje e ainda não encerradas"""
+        return set(self._open_due_rows[:bisect_left(self._open_due_dates, today)])
+
+    def count_by(self, field: str, rows: Optional[Set[int]] = None) -> Counter:
+        """Contagem por valor normalizado do campo, rotulada pelo valor original (None para linhas sem valor)
+
+        Sem filtro, as contagens saem direto do índice.
+        """
+        if rows is None:
+            keys = Counter({key: len(value_rows) for key, value_rows in self.index[field].items()})
+            missing = len(self) - sum(keys.values())
+            if missing:
+                keys[None] = missing
+        else:
+            column = self.columns[field]
+            keys = Counter(normalize(column[row]) if column[row] is not None else None for row in rows)
+        return Counter({self.raw_values[field][key] if key is not None else None: count for key, count in keys.items()})
+
+    def values_in(self, field: str, text: str) -> List[str]:
+        """Valores indexados do campo citados no texto normalizado"""
+        padded = f" {text} "
+        return [value for value in self.index[field] if value and f" {value} " in padded]
+
+class StructuredIndex:
+    """Responde perguntas de contagem e filtro sobre projetos e tarefas com fatos exatos"""
+    def __init__(self, projects: Iterable[Dict[str, Any]], tasks: Iterable[Dict[str, Any]], max_items: Optional[int] = None):
+        self.projects = RecordTable(projects)
+        self.tasks = RecordTable(tasks)
+        self.max_items = max_items or int(os.getenv('STRUCTURED_FACTS_MAX_ITEMS', '20'))
+        self._project_rows = {normalize(pid): row for row, pid in enumerate(self.projects.ids)}
+
+    def _project_name(self, project_id: Any) -> str:
+        row = self._project_rows.get(normalize(project_id))
+        label = self.projects.labels[row] if row is not None else ''
+        return f"projeto {project_id} ({label})" if label else f"projeto {project_id}"
+
+    def _referenced_project(self, text: str) -> Optional[str]:
+        """Projeto citado na pergunta, pelo id ou pelo nome"""
+        match = _PROJECT_REF.search(text)
+        if match:
+            reference = match.group(1)
+            if reference in self.tasks.index['project_id'] or reference in self._project_rows:
+                return reference
+
+        named = [(len(normalize(label)), pid) for pid, label in zip(self.projects.ids, self.projects.labels) if label and f" {normalize(label)} " in f" {text} "]
+        return normalize(max(named)[1]) if named else None
+
+    def _describe(self, table: RecordTable, row: int) -> str:
+        details = [f"{name}: {table.columns[field][row]}" for field, name in (
+            ('status', 'status'), ('priority', 'prioridade'), ('due_date', 'vencimento'), ('project_id', 'projeto')
+        ) if table.columns[field][row] is not None]
+        return f"  - #{table.ids[row]} {table.labels[row]}" + (f" ({'; '.join(details)})" if details else '')
+
+    def facts(self, query: str, today: Optional[date] = None) -> Optional[str]:
+        """Fatos calculados sobre todos os registros (None se a pergunta não for de contagem ou filtro)"""
+        text = normalize(query)
+        words = text.split()
+        if any(word.startswith('tarefa') for word in words):
+            table, kind = self.tasks, 'Tarefas'
+        elif any(word.startswith('projeto') for word in words):
+            table, kind = self.projects, 'Projetos'
+        else:
+            return None
+        if not len(table):
+            return None
+
+        today = today or date.today()
+        selections: List[Set[int]] = []
+        conditions: List[str] = []
+
+        statuses = table.values_in('status', text)
+        if statuses:
+            selections.append(table.rows_where('status', statuses))
+            conditions.append("com status " + " ou ".join(f'"{table.raw_values["status"][status]}"' for status in statuses))
+        if 'prioridade' in words or 'priority' in words:
+            priorities = table.values_in('priority', text)
+            if priorities:
+                selections.append(table.rows_where('priority', priorities))
+                conditions.append("com prioridade " + " ou ".join(f'"{table.raw_values["priority"][priority]}"' for priority in priorities))
+        project = self._referenced_project(text) if table is self.tasks else None
+        if project is not None:
+            selections.append(table.rows_where('project_id', [project]))
+            conditions.append(f"do {self._project_name(project)}")
+        if any(word.startswith(_OVERDUE_STEMS) or word in _OVERDUE_WORDS for word in words):
+            selections.append(table.overdue_rows(today))
+            conditions.append(f"em atraso (vencimento antes de {today.isoformat()}, sem status de concluído)")
+
+        # Interseção a partir do menor conjunto; sem filtros, vale a tabela inteira
+        rows: Optional[Set[int]] = None
+        for selection in sorted(selections, key=len):
+            rows = set(selection) if rows is None else rows & selection
+        total = len(table) if rows is None else len(rows)
+
+        group = None
+        if 'por status' in text:
+            group = 'status'
+        elif 'por prioridade' in text:
+            group = 'priority'
+        elif table is self.tasks and project is None and ('por projeto' in text or (('mais' in words or 'menos' in words) and 'projeto' in text)):
+            group = 'project_id'
+
+        counting = any(word.startswith(_COUNT) for word in words)
+        if not conditions and group is None and not counting:
+            return None
+
+        lines = ["Dados exatos calculados sobre todos os registros (use-os em vez de contar pelo contexto):"]
+        lines.append(f"- {kind}{' ' + ', '.join(conditions) if conditions else ''}: {total}")
+        if group is not None:
+            counts = table.count_by(group, rows).most_common(self.max_items)
+            label = self._project_name if group == 'project_id' else str
+            lines.append(f"- {kind} por {_FIELD_NAMES[group]}: " + "; ".join(
+                f"{label(value) if value is not None else 'sem valor'}: {count}" for value, count in counts
+            ))
+        elif rows is not None:
+            listed = heapq.nsmallest(self.max_items, rows)
+            lines.extend(self._describe(table, row) for row in listed)
+            if total > len(listed):
+                lines.append(f"  - ... e mais {total - len(listed)}")
+        return "\n".join(lines)
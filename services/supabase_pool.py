@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional, Union
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
+from postgrest.utils import SyncClient
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+
+class PoolStats:
+    """Contadores de uso do pool HTTP do Supabase"""
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_latency = 0.0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, elapsed: float, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.total_latency += elapsed
+            if failed:
+                self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'avg_latency_ms': round(self.total_latency / self.requests * 1000, 2) if self.requests else 0.0
+            }
+
+class _InstrumentedTransport(httpx.HTTPTransport):
+    """Transporte HTTP com keep-alive que registra as métricas do pool"""
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        start = time.perf_counter()
+        failed = False
+        try:
+            response = super().handle_request(request)
+            failed = response.status_code >= 500
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.stats.finished(time.perf_counter() - start, failed)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Conta as conexões abertas e ociosas do pool"""
+        try:
+            connections = list(self._pool.connections)
+        except AttributeError:
+            return {}
+        return {
+            'connections': len(connections),
+            'idle_connections': sum(1 for conn in connections if conn.is_idle())
+        }
+
+class _PooledPostgrestClient(SyncPostgrestClient):
+    """Cliente PostgREST que usa o transporte compartilhado"""
+    def __init__(self, base_url: str, transport: _InstrumentedTransport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url: str, headers: Dict[str, str], timeout: Union[int, float, httpx.Timeout]) -> SyncClient:
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=self._transport
+        )
+
+class PooledSupabaseClient(Client):
+    """Cliente Supabase cujas requisições PostgREST reutilizam um pool de conexões"""
+    def __init__(self, supabase_url: str, supabase_key: str, transport: _InstrumentedTransport):
+        self._transport = transport
+        super().__init__(supabase_url, supabase_key, ClientOptions())
+
+    def _init_postgrest_client(
+        self,
+        rest_url: str,
+        headers: Dict[str, str],
+        schema: str,
+        timeout: Union[int, float, httpx.Timeout] = DEFAULT_POSTGREST_CLIENT_TIMEOUT,
+    ) -> SyncPostgrestClient:
+        return _PooledPostgrestClient(
+            rest_url,
+            self._transport,
+            headers=headers,
+            schema=schema,
+            timeout=timeout
+        )
+
+_client: Optional[PooledSupabaseClient] = None
+_transport: Optional[_InstrumentedTransport] = None
+_stats = PoolStats()
+_lock = threading.Lock()
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '20')),
+        max_keepalive_connections=int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '10')),
+        keepalive_expiry=float(os.getenv('SUPABASE_POOL_KEEPALIVE_EXPIRY', '30'))
+    )
+
+def get_supabase_client() -> Client:
+    """Retorna o cliente Supabase compartilhado pelo processo (criado sob demanda)"""
+    global _client, _transport
+    with _lock:
+        if _client is None:
+            _transport = _InstrumentedTransport(_stats, limits=_pool_limits())
+            _client = PooledSupabaseClient(
+                os.getenv('SUPABASE_URL'),
+                os.getenv('SUPABASE_SERVICE_KEY'),
+                _transport
+            )
+        return _client
+
+def supabase_pool_stats() -> Dict[str, Any]:
+    """Retorna as métricas e a configuração do pool do Supabase"""
+    limits = _pool_limits()
+    stats = {
+        'initialized': _client is not None,
+        'max_connections': limits.max_connections,
+        'max_keepalive_connections': limits.max_keepalive_connections,
+        'keepalive_expiry': limits.keepalive_expiry,
+        **_stats.snapshot()
+    }
+    if _transport is not None:
+        stats.update(_transport.connection_stats())
+    return stats
@@ -0,0 +1,281 @@
+import os
+import sys
+import uuid
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import Qdrant
+from qdrant_client import QdrantClient
+from services.metadata_filter import MetadataFilter, PAYLOAD_INDEX_FIELDS, normalize_filter, matches_filter, qdrant_filter
+
+class NumpyVectorIndex:
+    """Índice vetorial em memória sobre uma matriz float32 contígua"""
+    def __init__(self, embedding, initial_capacity: int = 256):
+        self.embedding = embedding
+        self.documents: List[Document] = []
+        self.ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        # Índices de payload: campo -> valor (texto) -> linhas
+        self._payload: Dict[str, Dict[str, Set[int]]] = {field: {} for field in PAYLOAD_INDEX_FIELDS}
+        self._size = 0
+        self._initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding, ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorIndex":
+        """Cria o índice e adiciona os documentos"""
+        index = cls(embedding)
+        index.add_documents(documents, ids=ids)
+        return index
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Normaliza as linhas para que o produto escalar seja a similaridade de cosseno"""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        """Garante espaço na matriz, dobrando a capacidade quando necessário"""
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, rows)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            return
+
+        if self._matrix.shape[1] != dim:
+            raise ValueError(f"Dimensão do embedding ({dim}) difere da do índice ({self._matrix.shape[1]})")
+
+        needed = self._size + rows
+        if needed > self._matrix.shape[0]:
+            capacity = max(needed, self._matrix.shape[0] * 2)
+            matrix = np.zeros((capacity, dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def _index_row(self, row: int, document: Document):
+        for field, values in self._payload.items():
+            if field in document.metadata:
+                values.setdefault(str(document.metadata[field]), set()).add(row)
+
+    def _unindex_row(self, row: int, document: Document):
+        for field, values in self._payload.items():
+            if field in document.metadata:
+                rows = values.get(str(document.metadata[field]))
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del values[str(document.metadata[field])]
+
+    def _filtered_rows(self, filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """Linhas que atendem ao filtro, pelos índices de payload (None se não houver filtro)"""
+        normalized = normalize_filter(filter)
+        if normalized is None:
+            return None
+
+        rows: Optional[Set[int]] = None
+        unindexed = {}
+        for field, values in sorted(normalized.items(), key=lambda item: item[0] not in self._payload):
+            if field not in self._payload:
+                unindexed[field] = values
+                continue
+            matched = set().union(*(self._payload[field].get(value, ()) for value in values))
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                return np.empty(0, dtype=np.int64)
+
+        # Campos sem índice são conferidos nos metadados das linhas restantes
+        candidates = range(self._size) if rows is None else rows
+        if unindexed:
+            candidates = [row for row in candidates if matches_filter(self.documents[row].metadata, unindexed)]
+        return np.fromiter(sorted(candidates), dtype=np.int64)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Adiciona documentos ao índice (documentos com ID existente são substituídos)"""
+        if not documents:
+            return []
+
+        vectors = self.embedding.embed_documents([doc.page_content for doc in documents])
+        return self.add_vectors(vectors, documents, ids=ids)
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Adiciona textos ao índice"""
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_documents(documents, ids=ids)
+
+    def add_vectors(self, vectors: List[List[float]], documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Adiciona embeddings já calculados ao índice"""
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in documents]
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            self._ensure_capacity(len(documents), matrix.shape[1])
+            for doc_id, document, vector in zip(ids, documents, matrix):
+                row = self._id_to_row.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._id_to_row[doc_id] = row
+                    self.documents.append(document)
+                    self.ids.append(doc_id)
+                else:
+                    self._unindex_row(row, self.documents[row])
+                    self.documents[row] = document
+                self._index_row(row, document)
+                self._matrix[row] = vector
+
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> bool:
+        """Remove os documentos pelos IDs (a última linha ocupa o lugar da removida)"""
+        with self._lock:
+            for doc_id in ids or []:
+                row = self._id_to_row.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                self._unindex_row(row, self.documents[row])
+                if row != last:
+                    self._unindex_row(last, self.documents[last])
+                    self._index_row(row, self.documents[last])
+                    self._matrix[row] = self._matrix[last]
+                    self.documents[row] = self.documents[last]
+                    self.ids[row] = self.ids[last]
+                    self._id_to_row[self.ids[row]] = row
+                self.documents.pop()
+                self.ids.pop()
+                self._size -= 1
+        return True
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Seleciona os índices dos k maiores scores, em ordem decrescente"""
+        if k < scores.shape[-1]:
+            candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        else:
+            candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape[:-1] + (scores.shape[-1],))
+        order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1)
+        return np.take_along_axis(candidates, order, axis=-1)
+
+    def batch_similarity_search_with_score_by_vectors(self, embeddings: List[List[float]], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[List[Tuple[Document, float]]]:
+        """Busca vários vetores de uma vez com uma única multiplicação de matrizes
+
+        Com filtro, só as linhas selecionadas pelos índices de payload são pontuadas.
+        """
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+
+        # Os scores são calculados sob o lock: delete e upsert reescrevem linhas da matriz no lugar
+        with self._lock:
+            size = self._size
+            documents = self.documents[:size]
+            rows = self._filtered_rows(filter)
+            candidates = size if rows is None else len(rows)
+            if candidates == 0 or k <= 0:
+                return [[] for _ in embeddings]
+            scores = queries @ (self._matrix[:size] if rows is None else self._matrix[rows]).T
+
+        top = self._top_k(scores, min(k, candidates))
+
+        return [
+            [(documents[row if rows is None else rows[row]], float(scores[i, row])) for row in top[i]]
+            for i in range(len(embeddings))
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Retorna os k documentos mais similares ao vetor, com o score"""
+        return self.batch_similarity_search_with_score_by_vectors([embedding], k=k, filter=filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Document]:
+        """Retorna os k documentos mais similares ao vetor"""
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+        """Retorna os k documentos mais similares à consulta, com o score"""
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Document]:
+        """Retorna os k documentos mais similares à consulta"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[List[Document]]:
+        """Busca várias consultas, gerando os embeddings em um único lote"""
+        embeddings = self.embedding.embed_documents(queries)
+        return [
+            [doc for doc, _ in results]
+            for results in self.batch_similarity_search_with_score_by_vectors(embeddings, k=k, filter=filter)
+        ]
+
+    def memory_usage(self) -> int:
+        """Bytes ocupados pela matriz e pelos textos dos documentos"""
+        matrix_bytes = self._matrix.nbytes if self._matrix is not None else 0
+        return matrix_bytes + sum(sys.getsizeof(doc.page_content) for doc in self.documents)
+
+    def __len__(self) -> int:
+        return self._size
+
+def estimate_index_bytes(vector_store, documents: List[Document], dimensions: int = 1536) -> int:
+    """Estimativa aproximada da memória de um índice vetorial"""
+    if isinstance(vector_store, NumpyVectorIndex):
+        return vector_store.memory_usage()
+    return sum(sys.getsizeof(doc.page_content) for doc in documents) + len(documents) * dimensions * 4
+
+def similarity_search_with_score_by_vector(vector_store, embedding: List[float], k: int = 4, filter: Optional[MetadataFilter] = None) -> List[Tuple[Document, float]]:
+    """Busca por vetor em qualquer backend, convertendo o filtro de metadados quando preciso"""
+    if not filter:
+        return vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+    if isinstance(vector_store, Qdrant):
+        filter = qdrant_filter(filter, vector_store.metadata_payload_key)
+    return vector_store.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+def set_embeddings(vector_store, embeddings):
+    """Troca os embeddings usados pelo índice nas próximas inserções e buscas"""
+    if isinstance(vector_store, NumpyVectorIndex):
+        vector_store.embedding = embeddings
+    elif isinstance(vector_store, Qdrant):
+        vector_store._embeddings = embeddings
+
+def create_payload_indexes(client: QdrantClient, collection_name: str, documents: List[Document]):
+    """Cria índices de payload no Qdrant para os campos filtráveis presentes nos documentos"""
+    from qdrant_client.http import models as rest
+
+    for field in PAYLOAD_INDEX_FIELDS:
+        sample = next((doc.metadata[field] for doc in documents if field in doc.metadata), None)
+        if sample is None:
+            continue
+        schema = rest.PayloadSchemaType.INTEGER if isinstance(sample, int) and not isinstance(sample, bool) else rest.PayloadSchemaType.KEYWORD
+        client.create_payload_index(collection_name, field_name=f"metadata.{field}", field_schema=schema)
+
+def open_vector_store(collection_name: str, embeddings) -> Optional[Qdrant]:
+    """Reabre uma coleção já existente no Qdrant remoto (None se não houver como reutilizar)"""
+    if os.getenv('VECTOR_BACKEND', 'qdrant').lower() == 'numpy' or os.getenv('QDRANT_HOST') == 'localhost':
+        return None
+
+    client = QdrantClient(
+        url=f"http://{os.getenv('QDRANT_HOST')}:{os.getenv('QDRANT_PORT')}",
+        api_key=os.getenv('QDRANT_API_KEY')
+    )
+    try:
+        client.get_collection(collection_name)
+    except Exception:
+        return None
+    return Qdrant(client=client, collection_name=collection_name, embeddings=embeddings)
+
+def setup_vector_store(documents: List[Document], embeddings, collection_name: str, ids: Optional[List[str]] = None):
+    """Set up the vector store with the documents (backend definido por VECTOR_BACKEND)"""
+    if os.getenv('VECTOR_BACKEND', 'qdrant').lower() == 'numpy':
+        return NumpyVectorIndex.from_documents(documents, embeddings, ids=ids)
+
+    vector_store = Qdrant.from_documents(
+        documents=documents,
+        embedding=embeddings,
+        ids=ids,
+        location=":memory:" if os.getenv('QDRANT_HOST') == 'localhost' else None,
+        url=f"http://{os.getenv('QDRANT_HOST')}:{os.getenv('QDRANT_PORT')}" if os.getenv('QDRANT_HOST') != 'localhost' else None,
+        api_key=os.getenv('QDRANT_API_KEY'),
+        collection_name=collection_name
+    )
+    if os.getenv('QDRANT_HOST') != 'localhost':
+        # Buscas filtradas por tipo, projeto ou processing_id usam os índices de payload
+        create_payload_indexes(vector_store.client, collection_name, documents)
+    return vector_store
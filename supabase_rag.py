@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 import os
+import sys
 import json
-from typing import List, Dict, Optional
+import uuid
+import threading
+from typing import Any, AsyncIterator, List, Dict, Optional
 from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from groq import Groq
-from langchain_openai import OpenAIEmbeddings
 from langchain.schema import Document
-from langchain_community.vectorstores import Qdrant
+from services.embedding_cache import get_embeddings
+from services.vector_store import set_embeddings, setup_vector_store, open_vector_store, estimate_index_bytes, similarity_search_with_score_by_vector
+from services.session_store import SessionStore
+from services.context_builder import context_packer
+from services.lexical_index import BM25Index, hybrid_search, retrieval_stats
+from services.structured_index import StructuredIndex
+from services.session_warmup import SessionWarmup, SessionNotReady
+from services.llm_service import get_async_groq_client, get_groq_response, stream_groq_response, sse_stream, SSE_HEADERS
 from supabase import create_client, Client
 import time
 
@@ -20,28 +30,204 @@ class ProjectTask:
                 user_pronoun: str, 
                 projects_data, 
                 tasks_data,
-                timestamp: Optional[str] = None):
+                timestamp: Optional[str] = None,
+                collection_name: Optional[str] = None,
+                progress=None):
         self.user_name = user_name
         self.user_pronoun = user_pronoun
         self.projects_data = projects_data
         self.tasks_data = tasks_data
         self.timestamp = timestamp
+        self.collection_name = collection_name
+        self.progress = progress
         self.vector_store = None
+        self.lexical_index = None
+        self.structured_index = None
+        self.embeddings = None
+        self.index_bytes = 0
+        self.document_contents: Dict[str, str] = {}
+        self._update_lock = threading.Lock()
         self.groq_client = None
         self.chat_history: List[Dict[str, str]] = []
+        self.system_message = self.build_system_message()
         self.setup()
     
     def setup(self):
         """Inicializa os componentes necessários para a sessão"""
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        embeddings = OpenAIEmbeddings(model=os.getenv('EMBEDDING_MODEL_NAME', 'text-embedding-3-small'))
+        self.groq_client = get_async_groq_client()
+        self.embeddings = get_embeddings()
         
         # Cria documentos para embedding diretamente dos dados fornecidos
         documents = self.create_documents(self.projects_data, self.tasks_data)
+        embeddings = self.embeddings
+        if self.progress is not None:
+            self.progress.loaded(len(documents))
+            embeddings = self.progress.track(embeddings)
         
-        # Configura o vector store com os documentos
-        collection_name = f"project_tasks_{self.user_name}_{int(time.time())}"
-        self.vector_store = setup_vector_store(documents, embeddings, collection_name)
+        # Reaproveita a coleção criada por outro worker, quando o backend permite
+        self.vector_store = open_vector_store(self.collection_name, self.embeddings) if self.collection_name else None
+        
+        self.collection_name = self.collection_name or f"project_tasks_{self.user_name}_{int(time.time())}"
+        ids = self.document_ids(documents)
+        if self.vector_store is None:
+            # Configura o vector store com os documentos
+            self.vector_store = setup_vector_store(documents, embeddings, self.collection_name, ids=ids)
+            # Atualizações posteriores (PATCH) não contam no progresso da criação
+            set_embeddings(self.vector_store, self.embeddings)
+        self.index_bytes = estimate_index_bytes(self.vector_store, documents)
+        
+        # Índice BM25 dos mesmos documentos (ids, status e nomes são bem atendidos por termos)
+        self.lexical_index = BM25Index.from_documents(documents, ids=ids)
+        self.document_contents = {doc_id: doc.page_content for doc_id, doc in zip(ids, documents)}
+        
+        # Tabela colunar dos registros para perguntas de contagem e filtro
+        self.structured_index = self.build_structured_index(self.projects_data, self.tasks_data)
+        if self.progress is not None:
+            self.progress.indexed(len(documents))
+    
+    def build_structured_index(self, projects_data, tasks_data) -> StructuredIndex:
+        """Indexa status, prioridade, vencimento e projeto dos registros estruturados"""
+        def records(data, type_name):
+            try:
+                return self._parse_items(data, type_name)
+            except ValueError:
+                return []
+        return StructuredIndex(records(projects_data, "Projetos"), records(tasks_data, "Tarefas"))
+    
+    def document_ids(self, documents: List[Document]) -> List[str]:
+        """IDs determinísticos dos documentos (mesmo item, mesmo ID em todas as versões da sessão)"""
+        return [
+            str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.collection_name}/{doc.metadata.get('type')}/{doc.metadata.get('id', f'#{i}')}"))
+            for i, doc in enumerate(documents)
+        ]
+    
+    @staticmethod
+    def _parse_items(data, type_name: str) -> List[Dict[str, Any]]:
+        """Itens estruturados dos dados da sessão (texto livre não pode ser atualizado por item)"""
+        if data is None:
+            return []
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise ValueError(f"{type_name} da sessão não estão em JSON e não podem ser atualizados por item")
+        if isinstance(data, dict):
+            data = [data]
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise ValueError(f"{type_name} da sessão não são uma lista de objetos")
+        return list(data)
+    
+    @staticmethod
+    def _merge_items(items: List[Dict[str, Any]], upsert: List[Dict[str, Any]], delete: List[Any], type_name: str) -> List[Dict[str, Any]]:
+        """Aplica as alterações por id: itens alterados ficam na mesma posição, novos vão para o fim"""
+        positions = {str(item.get('id')): i for i, item in enumerate(items) if 'id' in item}
+        merged = list(items)
+        for item in upsert:
+            if 'id' not in item:
+                raise ValueError(f"Todo item de {type_name.lower()} enviado precisa de um id")
+            position = positions.get(str(item['id']))
+            if position is None:
+                positions[str(item['id'])] = len(merged)
+                merged.append(item)
+            else:
+                merged[position] = item
+        
+        removed = {str(item_id) for item_id in delete}
+        return [item for item in merged if str(item.get('id')) not in removed]
+    
+    def apply_changes(self, projects: Optional[Dict[str, list]] = None, tasks: Optional[Dict[str, list]] = None) -> Dict[str, int]:
+        """Atualiza projetos e tarefas por id, reindexando apenas os documentos alterados"""
+        with self._update_lock:
+            projects_data, tasks_data = self.projects_data, self.tasks_data
+            if projects:
+                projects_data = self._merge_items(self._parse_items(projects_data, "Projetos"), projects.get('upsert', []), projects.get('delete', []), "Projetos")
+            if tasks:
+                tasks_data = self._merge_items(self._parse_items(tasks_data, "Tarefas"), tasks.get('upsert', []), tasks.get('delete', []), "Tarefas")
+            return self._reindex(projects_data, tasks_data)
+    
+    def _reindex(self, projects_data, tasks_data) -> Dict[str, int]:
+        """Troca os dados da sessão, reindexando apenas os documentos alterados (chamado com _update_lock)"""
+        # Compara os documentos regenerados com os indexados pelo ID determinístico
+        documents = self.create_documents(projects_data, tasks_data)
+        ids = self.document_ids(documents)
+        changed = [
+            (doc_id, doc) for doc_id, doc in zip(ids, documents)
+            if self.document_contents.get(doc_id) != doc.page_content
+        ]
+        removed = list(set(self.document_contents) - set(ids))
+        
+        if removed:
+            self.vector_store.delete(ids=removed)
+            self.lexical_index.delete(removed)
+        if changed:
+            changed_ids = [doc_id for doc_id, _ in changed]
+            changed_docs = [doc for _, doc in changed]
+            self.vector_store.add_documents(changed_docs, ids=changed_ids)
+            self.lexical_index.add_documents(changed_docs, ids=changed_ids)
+        
+        self.projects_data, self.tasks_data = projects_data, tasks_data
+        self.document_contents = {doc_id: doc.page_content for doc_id, doc in zip(ids, documents)}
+        self.structured_index = self.build_structured_index(projects_data, tasks_data)
+        self.index_bytes = estimate_index_bytes(self.vector_store, documents)
+        return {
+            'upserted': len(changed),
+            'deleted': len(removed),
+            'unchanged': len(documents) - len(changed)
+        }
+    
+    def build_system_message(self) -> str:
+        """Parte estável do prompt, montada uma única vez por sessão"""
+        return f"""Você é um assistente de projetos e tarefas para {self.user_name}. 
+Trate {self.user_name} usando o pronome {self.user_pronoun}.
+
+Instruções de Resposta:
+1. Use o contexto fornecido para responder à pergunta sobre os projetos e tarefas de {self.user_name}
+2. Se a informação não estiver no contexto, diga que não tem informação suficiente para responder
+3. Seja sempre cortês, profissional e útil
+4. Se questionado sobre projetos, foque nas informações dos projetos
+5. Se questionado sobre tarefas, foque nas informações das tarefas
+6. Se perguntado sobre uma relação entre projetos e tarefas, busque as conexões entre eles"""
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Estado serializável da sessão (o índice é referenciado pela coleção)"""
+        return {
+            'user_name': self.user_name,
+            'user_pronoun': self.user_pronoun,
+            'projects_data': self.projects_data,
+            'tasks_data': self.tasks_data,
+            'timestamp': self.timestamp,
+            'collection_name': self.collection_name,
+            'chat_history': self.chat_history
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], progress=None) -> "ProjectTask":
+        """Reconstrói a sessão a partir do estado salvo por outro worker"""
+        session = cls(
+            record['user_name'],
+            record['user_pronoun'],
+            record['projects_data'],
+            record['tasks_data'],
+            record.get('timestamp'),
+            record.get('collection_name'),
+            progress
+        )
+        session.chat_history = list(record.get('chat_history', []))
+        return session
+    
+    def apply_record(self, record: Dict[str, Any]):
+        """Atualiza a sessão com o estado gravado por outro worker, reindexando só o que mudou"""
+        with self._update_lock:
+            if record['projects_data'] != self.projects_data or record['tasks_data'] != self.tasks_data:
+                self._reindex(record['projects_data'], record['tasks_data'])
+            self.chat_history = list(record.get('chat_history', []))
+    
+    def estimate_size(self) -> int:
+        """Estimativa aproximada da memória da sessão"""
+        return 16 * 1024 + self.index_bytes + sum(
+            sys.getsizeof(msg['user']) + sys.getsizeof(msg['assistant'])
+            for msg in self.chat_history
+        )
     
     def create_documents(self, projects_data, tasks_data) -> List[Document]:
         """Cria documentos a partir dos dados de projetos e tarefas em qualquer formato"""
@@ -91,8 +277,9 @@ class ProjectTask:
         if isinstance(data, list):
             for i, item in enumerate(data):
                 if isinstance(item, dict):
-                    # Converte o item para um formato de texto estruturado
-                    item_text = f"{type_name} #{i+1}:\n"
+                    # Converte o item para um formato de texto estruturado (o cabeçalho usa o id,
+                    # para que remover um item não altere o texto dos seguintes)
+                    item_text = f"{type_name} #{item.get('id', i + 1)}:\n"
                     for key, value in item.items():
                         item_text += f"{key}: {value}\n"
                     
@@ -127,8 +314,17 @@ class UserConfig(BaseModel):
     tasks_data: Optional[str] = None
     timestamp: Optional[str] = None  # Campo para armazenar o timestamp
 
+class ItemChanges(BaseModel):
+    upsert: List[Dict[str, Any]] = []  # Itens novos ou alterados, identificados pelo campo id
+    delete: List[Any] = []  # IDs dos itens removidos
+
+class SessionUpdate(BaseModel):
+    projects: Optional[ItemChanges] = None
+    tasks: Optional[ItemChanges] = None
+
 class QueryRequest(BaseModel):
     message: str
+    filters: Optional[Dict[str, Any]] = None  # Metadados: campo -> valor ou lista de valores (ex.: type, project_id)
 
 class QueryResponse(BaseModel):
     response: str
@@ -146,7 +342,8 @@ app.add_middleware(
 )
 
 # Armazena as sessões ativas
-active_sessions: Dict[str, ProjectTask] = {}
+active_sessions = SessionStore(restore=ProjectTask.from_record, namespace='supabase_rag')
+session_warmup = SessionWarmup(active_sessions)
 
 def load_environment():
     """Load environment variables from .env file"""
@@ -166,65 +363,62 @@ def load_environment():
     if missing_vars:
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-def get_groq_response(client: Groq, prompt: str) -> str:
-    """Get response from Groq model"""
-    completion = client.chat.completions.create(
-        model=os.getenv('GROQ_MODEL_NAME', 'deepseek-r1-distill-llama-70b'),
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.6,
-        max_completion_tokens=1024,
-        top_p=0.95,
-        stream=False,
-        reasoning_format="hidden"
-    )
+async def build_rag_prompt(query: str, session: ProjectTask, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """Recupera o contexto (restrito aos metadados dos filtros) e monta o prompt final para a consulta"""
+    async def vector_search(k: int):
+        # Embedding assíncrono e busca fora do event loop
+        query_embedding = await session.embeddings.aembed_query(query)
+        return query_embedding, await run_in_threadpool(
+            similarity_search_with_score_by_vector,
+            session.vector_store,
+            query_embedding,
+            k,
+            filters
+        )
     
-    return completion.choices[0].message.content
-
-def setup_vector_store(documents: List[Document], embeddings, collection_name: str):
-    """Set up the Qdrant vector store with the documents"""
-    return Qdrant.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        location=":memory:" if os.getenv('QDRANT_HOST') == 'localhost' else None,
-        url=f"http://{os.getenv('QDRANT_HOST')}:{os.getenv('QDRANT_PORT')}" if os.getenv('QDRANT_HOST') != 'localhost' else None,
-        api_key=os.getenv('QDRANT_API_KEY'),
-        collection_name=collection_name
+    def lexical_search(terms: List[str], k: int):
+        return session.lexical_index.search_terms(terms, k, filters)
+    
+    # Gera o contexto RAG: consultas lexicais (ids, status, nomes) são respondidas
+    # pelo BM25 sem embedding; as demais combinam BM25 e busca vetorial
+    results, _, _ = await hybrid_search(
+        query,
+        max(5, context_packer.candidates),
+        lexical_search,
+        vector_search,
+        context_packer.min_score
     )
-
-def get_rag_response(query: str, session: ProjectTask) -> str:
-    """Get RAG-enhanced response for a query"""
-    # Adiciona histórico ao contexto
-    chat_context = "\nHistórico da conversa:\n" + "\n".join([
+    
+    # Chunks e histórico (últimas 3 interações) dividem o mesmo orçamento de tokens
+    packed = context_packer.pack(results, [
         f"Usuário: {msg['user']}\nAssistente: {msg['assistant']}"
-        for msg in session.chat_history[-3:]  # Últimas 3 interações
-    ]) if session.chat_history else ""
+        for msg in session.chat_history[-3:]
+    ], min_score=0.0)
+    rag_context = packed.rag_context
     
-    # Gera o contexto RAG
-    results = session.vector_store.similarity_search(query, k=5)
-    rag_context = "\n".join([doc.page_content for doc in results])
+    # Contagens e filtros vêm da tabela estruturada, que cobre todos os registros
+    facts = session.structured_index.facts(query)
+    if facts:
+        retrieval_stats.record('structured')
+        rag_context = f"{facts}\n{rag_context}"
+    chat_context = "\nHistórico da conversa:\n" + "\n".join(packed.history) if packed.history else ""
     
     # Combina os contextos
     full_context = f"{rag_context}\n{chat_context}"
     
-    # Cria o prompt final
-    prompt = f"""Você é um assistente de projetos e tarefas para {session.user_name}. 
-Trate {session.user_name} usando o pronome {session.user_pronoun}.
-
-Instruções de Resposta:
-1. Use o contexto abaixo para responder à pergunta sobre os projetos e tarefas de {session.user_name}
-2. Se a informação não estiver no contexto, diga que não tem informação suficiente para responder
-3. Seja sempre cortês, profissional e útil
-4. Se questionado sobre projetos, foque nas informações dos projetos
-5. Se questionado sobre tarefas, foque nas informações das tarefas
-6. Se perguntado sobre uma relação entre projetos e tarefas, busque as conexões entre eles
-
-Contexto:
-{full_context}
+    # Mensagem de sistema fixa da sessão seguida das partes variáveis
+    return [
+        {"role": "system", "content": session.system_message},
+        {"role": "user", "content": f"Contexto:\n{full_context}"},
+        {"role": "user", "content": f"Pergunta: {query}"}
+    ]
 
-Pergunta: {query}"""
+async def get_rag_response(query: str, session: ProjectTask, filters: Optional[Dict[str, Any]] = None) -> str:
+    """Get RAG-enhanced response for a query"""
+    messages = await build_rag_prompt(query, session, filters)
     
     # Obtém a resposta
-    response = get_groq_response(session.groq_client, prompt)
+    response = await get_groq_response(session.groq_client, messages)
     
     # Atualiza o histórico
     session.chat_history.append({
@@ -234,11 +428,38 @@ Pergunta: {query}"""
     
     return response
 
+async def stream_rag_response(query: str, session: ProjectTask, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Stream RAG-enhanced response tokens for a query"""
+    messages = await build_rag_prompt(query, session, filters)
+    
+    parts = []
+    async for token in stream_groq_response(session.groq_client, messages):
+        parts.append(token)
+        yield token
+    
+    # O histórico só é atualizado quando o stream termina por completo
+    session.chat_history.append({
+        "user": query,
+        "assistant": "".join(parts)
+    })
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializa as configurações necessárias"""
     load_environment()
 
+async def get_session(session_id: str) -> ProjectTask:
+    """Busca a sessão pronta, aguardando a preparação ou reidratando-a do backend compartilhado"""
+    try:
+        session = await session_warmup.get(session_id)
+    except SessionNotReady as e:
+        raise HTTPException(status_code=503, detail=e.progress.to_dict(), headers={"Retry-After": "2"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return session
+
 @app.post("/rag/session")
 async def create_session(config: UserConfig) -> Dict[str, str]:
     """Cria uma nova sessão RAG"""
@@ -250,35 +471,74 @@ async def create_session(config: UserConfig) -> Dict[str, str]:
         session_id = f"{config.user_name}_{int(time.time())}"
         
         if session_id not in active_sessions:
-            active_sessions[session_id] = ProjectTask(
+            # A indexação roda em segundo plano; o progresso é consultado em /status
+            await session_warmup.create(session_id, lambda progress: ProjectTask(
                 config.user_name,
                 config.user_pronoun,
                 config.projects_data,
                 config.tasks_data,
-                timestamp
-            )
+                timestamp,
+                progress=progress
+            ))
         return {"session_id": session_id, "timestamp": timestamp}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rag/{session_id}/status")
+async def session_status(session_id: str) -> Dict[str, Any]:
+    """Informa o progresso da preparação da sessão (chunks carregados, embedados e indexados)"""
+    status = await session_warmup.status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return status
+
 @app.post("/rag/{session_id}")
 async def query(session_id: str, request: QueryRequest) -> QueryResponse:
     """Processa uma consulta RAG"""
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    session = await get_session(session_id)
     
     try:
-        session = active_sessions[session_id]
-        response = get_rag_response(request.message, session)
+        response = await get_rag_response(request.message, session, request.filters)
+        await active_sessions.save(session_id, session)
         return QueryResponse(response=response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rag/{session_id}/stream")
+async def query_stream(session_id: str, request: QueryRequest) -> StreamingResponse:
+    """Processa uma consulta RAG enviando os tokens via SSE"""
+    session = await get_session(session_id)
+    
+    tokens = active_sessions.persist_after(session_id, session, stream_rag_response(request.message, session, request.filters))
+    return StreamingResponse(
+        sse_stream(tokens),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.patch("/rag/{session_id}")
+async def update_session(session_id: str, update: SessionUpdate) -> Dict[str, Any]:
+    """Aplica alterações de projetos e tarefas à sessão, reindexando só o que mudou"""
+    session = await get_session(session_id)
+    
+    try:
+        result = await run_in_threadpool(
+            session.apply_changes,
+            update.projects.dict() if update.projects else None,
+            update.tasks.dict() if update.tasks else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    await active_sessions.save(session_id, session)
+    return {"status": "success", **result}
+
 @app.delete("/rag/{session_id}")
 async def end_session(session_id: str):
     """Encerra uma sessão RAG"""
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+    await session_warmup.discard(session_id)
     return {"status": "success"}
 
 # Para deploy no Railway
@@ -16,11 +16,19 @@ CREATE TABLE behavioral_prompts (
     bot_id UUID REFERENCES bots(id) ON DELETE CASCADE,
     behavior_type VARCHAR(50) NOT NULL,
     prompt TEXT NOT NULL,
+    patterns TEXT[] DEFAULT '{}' NOT NULL,
+    priority INTEGER DEFAULT 0 NOT NULL,
+    examples TEXT[] DEFAULT '{}' NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
     UNIQUE(bot_id, behavior_type)
 );
 
+-- Migração para bancos existentes: padrões de disparo, prioridade e exemplos dos comportamentos
+ALTER TABLE behavioral_prompts ADD COLUMN IF NOT EXISTS patterns TEXT[] DEFAULT '{}' NOT NULL;
+ALTER TABLE behavioral_prompts ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE behavioral_prompts ADD COLUMN IF NOT EXISTS examples TEXT[] DEFAULT '{}' NOT NULL;
+
 -- Função para atualizar o updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
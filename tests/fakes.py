@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+from services.session_backend import SessionBackend
+
+class MemoryBackend(SessionBackend):
+    """Backend compartilhado em memória, como se fosse o SQLite visto por dois workers"""
+    def __init__(self):
+        self.records: Dict[str, Dict[str, Any]] = {}
+
+    def save(self, key: str, record: Dict[str, Any]):
+        self.records[key] = dict(record)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self.records.get(key)
+        return dict(record) if record is not None else None
+
+    def delete(self, key: str):
+        self.records.pop(key, None)
+
+class FakeSession:
+    """Sessão mínima com a interface de to_record/from_record/apply_record das sessões reais"""
+    def __init__(self, name: str, progress=None):
+        self.name = name
+        self.progress = progress
+        self.chat_history = []
+
+    def to_record(self) -> Dict[str, Any]:
+        return {'name': self.name, 'chat_history': self.chat_history}
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], progress=None) -> "FakeSession":
+        session = cls(record['name'], progress)
+        session.apply_record(record)
+        return session
+
+    def apply_record(self, record: Dict[str, Any]):
+        self.chat_history = list(record.get('chat_history', []))
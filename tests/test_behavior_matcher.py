@@ -0,0 +1,69 @@
+import re
+from typing import Dict, List, Optional
+from prompt_middleware import BehaviorClassifier, CompiledBehaviorMatcher
+
+def reference_match(patterns: Dict[str, List[str]], priorities: Dict[str, int], message: str) -> Optional[str]:
+    """Comportamento esperado: primeiro re.search que casa, na ordem de prioridade"""
+    for behavior in sorted(patterns, key=lambda behavior: -priorities.get(behavior, 0)):
+        if any(pattern and re.search(pattern, message) for pattern in patterns[behavior]):
+            return behavior
+    return None
+
+def assert_matches_reference(patterns, priorities, messages):
+    matcher = CompiledBehaviorMatcher(patterns, priorities)
+    for message in messages:
+        assert matcher.match(message) == reference_match(patterns, priorities, message), message
+
+def test_shorter_keyword_of_higher_priority_wins_over_longer_literal():
+    patterns = {'CANCEL': ['cancela'], 'CHURN': ['cancelamento']}
+    priorities = {'CANCEL': 2, 'CHURN': 1}
+    assert CompiledBehaviorMatcher(patterns, priorities).match("quero o cancelamento") == 'CANCEL'
+
+def test_overlapping_literal_does_not_hide_higher_priority_regex():
+    patterns = {'REFUND': [r'reembols\w+'], 'PARTIAL': ['reemb']}
+    priorities = {'REFUND': 2, 'PARTIAL': 1}
+    matcher = CompiledBehaviorMatcher(patterns, priorities)
+    assert matcher.match("quero um reembolso") == 'REFUND'
+    assert matcher.match("reemb parcial") == 'PARTIAL'
+
+def test_inline_global_flags_do_not_break_compilation():
+    patterns = {'PRICE': ['(?i)preço'], 'OTHER': ['frete', r'entreg\w+']}
+    matcher = CompiledBehaviorMatcher(patterns, {'PRICE': 1})
+    assert matcher.match("qual o preço?") == 'PRICE'
+    assert matcher.match("qual o frete?") == 'OTHER'
+    assert matcher.match("bom dia") is None
+
+def test_same_named_group_in_two_behaviors():
+    patterns = {'A': [r'(?P<num>\d+) reais'], 'B': [r'pedido (?P<num>\d+)']}
+    matcher = CompiledBehaviorMatcher(patterns, {'A': 1})
+    assert matcher.match("pedido 42") == 'B'
+    assert matcher.match("custa 10 reais, pedido 3") == 'A'
+
+def test_numbered_backreferences_keep_their_meaning():
+    patterns = {'FIRST': [r'(x)y\1'], 'REPEAT': [r'(\w)\1{2}']}
+    assert_matches_reference(patterns, {}, ["aaa", "xyx", "abc", "kkk que caro"])
+
+def test_invalid_pattern_is_ignored():
+    matcher = CompiledBehaviorMatcher({'A': ['(abc'], 'B': ['abc']})
+    assert matcher.match("abc") == 'B'
+
+def test_agrees_with_reference_on_mixed_patterns():
+    patterns = {
+        'CANCEL': ['cancela', r'desist\w*', '(?i)encerrar'],
+        'CHURN': ['cancelamento', 'cancelar conta'],
+        'REFUND': [r'reembols\w+', r'dinheiro de volta'],
+        'PARTIAL': ['reemb', 'parcial'],
+        'PRICE': [r'pre[cç]o', r'(\d+)\s*x\s*\1'],
+    }
+    priorities = {'CANCEL': 3, 'REFUND': 2, 'CHURN': 1}
+    messages = [
+        "quero o cancelamento", "desisto", "encerrar", "reembolso parcial", "reemb", "qual o preço",
+        "pago em 3 x 3?", "nada a ver", "cancelar conta e dinheiro de volta",
+    ]
+    assert_matches_reference(patterns, priorities, messages)
+
+def test_classifier_lowercases_and_falls_back_to_general():
+    classifier = BehaviorClassifier()
+    classifier.update_patterns({'GENERAL': '', 'PRICE': ''}, {'PRICE': ['preço']})
+    assert classifier.classify("Qual o PREÇO?") == 'PRICE'
+    assert classifier.classify("Olá") == 'GENERAL'
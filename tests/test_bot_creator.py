@@ -0,0 +1,22 @@
+from services.bot_creator import PromptGenerator
+
+def test_parse_behaviors_normalizes_fields():
+    behaviors = PromptGenerator.parse_behaviors({
+        'PAYMENT': {
+            'prompt': "Explique as formas de pagamento.",
+            'patterns': ["Pix", "parcel\\w*", "(abc", "pix", ""],
+            'priority': "7",
+            'examples': ["Aceitam pix?", " ", "Posso parcelar?"]
+        },
+        'GENERAL': "Atenda com cordialidade.",
+        'GREETING': {'prompt': "Cumprimente.", 'priority': 'alta'}
+    })
+
+    assert behaviors['PAYMENT'] == {
+        'prompt': "Explique as formas de pagamento.",
+        'patterns': ["pix", "parcel\\w*"],
+        'priority': 7,
+        'examples': ["Aceitam pix?", "Posso parcelar?"]
+    }
+    assert behaviors['GENERAL'] == {'prompt': "Atenda com cordialidade.", 'patterns': [], 'priority': 0, 'examples': []}
+    assert behaviors['GREETING']['priority'] == 0
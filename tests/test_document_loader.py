@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+import pytest
+from services import document_loader
+
+class CappedQuery:
+    """Consulta do PostgREST que devolve no máximo max_rows linhas, como o max-rows do servidor"""
+    def __init__(self, rows, max_rows):
+        self.rows = rows
+        self.max_rows = max_rows
+        self.calls = 0
+        self._after = None
+        self._limit = None
+
+    def table(self, name):
+        self._after = None
+        self._limit = None
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def gt(self, column, value):
+        self._after = value
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def execute(self):
+        self.calls += 1
+        rows = [row for row in self.rows if self._after is None or row['chunk_index'] > self._after]
+        return SimpleNamespace(data=rows[:min(self._limit, self.max_rows)])
+
+def chunks(count):
+    return [{'chunk_text': f"chunk {index}", 'chunk_index': index} for index in range(count)]
+
+def test_short_pages_below_page_size_do_not_end_pagination(monkeypatch):
+    client = CappedQuery(chunks(5), max_rows=2)
+    monkeypatch.setattr(document_loader, 'get_supabase_client', lambda: client)
+
+    pages = list(document_loader.iter_document_chunk_pages('p1', page_size=10))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [doc.metadata['chunk_index'] for page in pages for doc in page] == [0, 1, 2, 3, 4]
+
+def test_missing_document_raises(monkeypatch):
+    monkeypatch.setattr(document_loader, 'get_supabase_client', lambda: CappedQuery([], max_rows=2))
+    with pytest.raises(ValueError):
+        list(document_loader.iter_document_chunk_pages('p1', page_size=10))
+
+class CountingEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+def test_shard_updates_after_build_do_not_count_in_progress(monkeypatch):
+    from langchain.schema import Document
+    from services.session_warmup import WarmupProgress
+
+    monkeypatch.setenv('VECTOR_BACKEND', 'numpy')
+    monkeypatch.setattr(document_loader, 'get_supabase_client', lambda: CappedQuery(chunks(3), max_rows=10))
+    progress = WarmupProgress()
+    embeddings = CountingEmbeddings()
+
+    shard = document_loader.build_chunk_shard('p1', embeddings, progress)
+    assert progress.chunks_embedded == 3
+    assert shard.vector_store.embedding is embeddings
+
+    shard.vector_store.add_documents([Document(page_content='novo', metadata={})], ids=['n1'])
+    assert progress.chunks_embedded == 3
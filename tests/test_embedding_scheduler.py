@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from typing import List
+from langchain_core.embeddings import Embeddings
+from services.embedding_scheduler import EmbeddingScheduler
+
+class BlockingEmbeddings(Embeddings):
+    """Embeddings que só respondem depois de liberados, para segurar o lote em andamento"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        self.release.wait(5)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def test_cancelled_request_does_not_block_the_rest_of_the_batch():
+    embeddings = BlockingEmbeddings()
+    scheduler = EmbeddingScheduler(embeddings, window=0.05, max_in_flight=1)
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(scheduler.aembed(['a']))
+        kept = asyncio.ensure_future(scheduler.aembed(['bb']))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0.2)
+        embeddings.release.set()
+        return await asyncio.wait_for(kept, 5)
+
+    assert asyncio.run(scenario()) == [[2.0]]
+    assert scheduler.embed(['ccc']) == [[3.0]]
+    assert scheduler.stats()['errors'] == 0
+
+def test_cancel_after_batch_is_taken_still_resolves_others():
+    embeddings = BlockingEmbeddings()
+    scheduler = EmbeddingScheduler(embeddings, window=0.05, max_in_flight=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(scheduler.aembed(['a']))
+        second = asyncio.ensure_future(scheduler.aembed(['bb']))
+        # Espera o lote com os dois pedidos chegar ao provedor antes de cancelar um deles
+        while not embeddings.calls:
+            await asyncio.sleep(0.01)
+        first.cancel()
+        embeddings.release.set()
+        return await asyncio.wait_for(second, 5)
+
+    assert asyncio.run(scenario()) == [[2.0]]
+    assert embeddings.calls[0] == ['a', 'bb']
+    assert scheduler.embed(['ccc']) == [[3.0]]
+
+def test_large_blocking_request_is_split_and_reassembled():
+    embeddings = BlockingEmbeddings()
+    embeddings.release.set()
+    scheduler = EmbeddingScheduler(embeddings, window=0, max_batch=2)
+
+    assert scheduler.embed(['a', 'bb', 'ccc', 'dddd', 'e']) == [[1.0], [2.0], [3.0], [4.0], [1.0]]
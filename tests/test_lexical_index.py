@@ -0,0 +1,61 @@
+import asyncio
+from langchain.schema import Document
+from services.lexical_index import BM25Index, hybrid_search
+
+def documents(count: int):
+    return [Document(page_content=f"tarefa {i} relatório trimestral", metadata={'id': i}) for i in range(count)]
+
+def run_hybrid(index: BM25Index, query: str):
+    async def vector_search(k):
+        return [0.0], [(Document(page_content="resultado vetorial"), 0.9)]
+    return asyncio.run(hybrid_search(query, 4, index.search_terms, vector_search, min_score=0.5))
+
+def test_routing_off_still_fuses_lexical_results(monkeypatch):
+    index = BM25Index.from_documents(documents(10), ids=[str(i) for i in range(10)])
+
+    _, embedding, route = run_hybrid(index, "tarefa 7")
+    assert route == 'lexical' and embedding is None
+
+    monkeypatch.setenv('LEXICAL_ROUTING', 'off')
+    results, embedding, route = run_hybrid(index, "tarefa 7")
+    assert route == 'hybrid' and embedding == [0.0]
+    contents = [doc.page_content for doc, _ in results]
+    assert "resultado vetorial" in contents
+    assert "tarefa 7 relatório trimestral" in contents
+
+def test_deletes_are_compacted():
+    ids = [str(i) for i in range(100)]
+    index = BM25Index.from_documents(documents(100), ids=ids)
+
+    for round_ in range(10):
+        index.delete(ids[:20])
+        index.add_documents(documents(100)[:20], ids=ids[:20])
+        assert index.tombstones <= index.compact_ratio * len(index.documents)
+    assert len(index) == 100
+    assert len(index.documents) <= 125
+
+    index.delete(ids[:50])
+    assert index.tombstones == 0 and len(index.documents) == 50
+    hits = index.search("tarefa 73", k=1)
+    assert hits[0][0].metadata['id'] == 73
+    assert sorted(doc.metadata['id'] for doc, _ in index.search("tarefa", k=100)) == list(range(50, 100))
+
+    index.add_documents([Document(page_content="tarefa 73 atualizada", metadata={'id': 73})], ids=['73'])
+    assert len(index) == 50
+    assert index.search("atualizada", k=1)[0][0].metadata['id'] == 73
+
+def test_sharded_lexical_search_does_not_compare_raw_scores():
+    from services.index_registry import IndexShard, ShardedVectorStore
+
+    # Shard grande: "alpha" é raro, e o único documento com ele recebe idf alto
+    large = BM25Index.from_documents(
+        [Document(page_content="alpha")] + [Document(page_content=f"outro {i}") for i in range(19)]
+    )
+    # Shard pequeno: todos os documentos têm os dois termos, idf baixo
+    small = BM25Index.from_documents([Document(page_content=f"alpha beta {i}") for i in range(3)])
+    assert large.search_terms(['alpha', 'beta'])[0][1] > small.search_terms(['alpha', 'beta'])[0][1]
+
+    store = ShardedVectorStore([IndexShard('a', None, large), IndexShard('b', None, small)], embeddings=None)
+    hits = store.lexical_search_terms(['alpha', 'beta'], k=4)
+    assert hits[0][0].page_content.startswith("alpha beta")
+    assert hits[0][2] == 2
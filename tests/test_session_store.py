@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from services.session_backend import REVISION_KEY, SessionBackend, SQLiteSessionBackend
+from services.session_store import SessionStore
+from services.session_warmup import SessionWarmup
+from tests.fakes import FakeSession, MemoryBackend
+
+def worker(backend: SessionBackend) -> SessionWarmup:
+    store = SessionStore(restore=FakeSession.from_record, namespace='test', backend=backend)
+    return SessionWarmup(store, wait_timeout=5)
+
+def test_session_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SessionBackend()
+
+    class Partial(SessionBackend):
+        def save(self, key, record):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_history_written_by_another_worker_is_reloaded():
+    backend = MemoryBackend()
+
+    async def scenario():
+        worker_a, worker_b = worker(backend), worker(backend)
+        await worker_a.create('s1', lambda progress: FakeSession('a', progress))
+        session_a = await worker_a.get('s1')
+        session_b = await worker_b.get('s1')
+
+        session_b.chat_history.append({'user': 'oi', 'assistant': 'olá'})
+        await worker_b.store.save('s1', session_b)
+
+        # Worker A continua a conversa a partir do histórico gravado por B
+        session = await worker_a.get('s1')
+        assert session is session_a
+        assert session.chat_history == [{'user': 'oi', 'assistant': 'olá'}]
+        session.chat_history.append({'user': 'tudo bem?', 'assistant': 'sim'})
+        await worker_a.store.save('s1', session)
+
+        assert len((await worker_b.get('s1')).chat_history) == 2
+        assert worker_a.store.stats()['reloaded'] == 1
+        assert worker_b.store.stats()['reloaded'] == 1
+
+    asyncio.run(scenario())
+
+def test_own_saves_do_not_trigger_reload():
+    async def scenario():
+        warmup = worker(MemoryBackend())
+        await warmup.create('s1', lambda progress: FakeSession('a', progress))
+        session = await warmup.get('s1')
+        for turn in range(3):
+            session.chat_history.append({'user': str(turn), 'assistant': str(turn)})
+            await warmup.store.save('s1', session)
+            assert await warmup.get('s1') is session
+        assert warmup.store.stats()['reloaded'] == 0
+
+    asyncio.run(scenario())
+
+def test_sessions_without_apply_record_are_restored():
+    class PlainSession:
+        def __init__(self, name: str):
+            self.name = name
+
+        def to_record(self):
+            return {'name': self.name}
+
+        @classmethod
+        def from_record(cls, record, progress=None):
+            return cls(record['name'])
+
+    backend = MemoryBackend()
+
+    async def scenario():
+        store_a = SessionStore(restore=PlainSession.from_record, namespace='test', backend=backend)
+        store_b = SessionStore(restore=PlainSession.from_record, namespace='test', backend=backend)
+        store_a['s1'] = PlainSession('a')
+        await store_a.save('s1')
+        store_b['s1'] = PlainSession.from_record(store_b.load_record('s1'))
+
+        session_b = store_b.get('s1')
+        session_b.name = 'b'
+        await store_b.save('s1')
+
+        refreshed = await store_a.refresh('s1', store_a.get('s1'))
+        assert refreshed.name == 'b'
+        assert store_a.get('s1') is refreshed
+
+    asyncio.run(scenario())
+
+def test_sqlite_backend_reads_revision(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / 'sessions.sqlite3'))
+    assert backend.load_revision('k') is None
+    backend.save('k', {'name': 'a', REVISION_KEY: 'r1'})
+    assert backend.load_revision('k') == 'r1'
+    backend.save('k', {'_pending': 1.0})
+    assert backend.load_revision('k') is None
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import pytest
+from services.session_backend import SessionBackend
+from services.session_store import SessionStore
+from services.session_warmup import SessionNotReady, SessionWarmup
+from tests.fakes import FakeSession, MemoryBackend
+
+def worker(backend: SessionBackend) -> SessionWarmup:
+    store = SessionStore(restore=FakeSession.from_record, namespace='test', backend=backend)
+    return SessionWarmup(store, wait_timeout=5)
+
+def failing_factory(progress):
+    raise ValueError("falha ao indexar")
+
+def test_failed_build_is_forgotten():
+    async def scenario():
+        warmup = worker(MemoryBackend())
+        progress = await warmup.create('s1', failing_factory)
+        with pytest.raises(RuntimeError):
+            await warmup.get('s1')
+        assert progress.status == 'failed'
+        assert await warmup.status('s1') is None
+        assert await warmup.get('s1') is None
+        assert warmup.stats()['failed'] == 1
+
+        # Um novo POST recria a sessão normalmente
+        await warmup.create('s1', lambda progress: FakeSession('ok', progress))
+        assert (await warmup.get('s1')).name == 'ok'
+
+    asyncio.run(scenario())
+
+def test_discard_during_save_does_not_resurrect_record():
+    backend = MemoryBackend()
+    saving = threading.Event()
+    release = threading.Event()
+    original_save = backend.save
+
+    def slow_save(key, record):
+        if 'name' in record:
+            saving.set()
+            release.wait(5)
+        original_save(key, record)
+
+    backend.save = slow_save
+
+    async def scenario():
+        warmup = worker(backend)
+        await warmup.create('s1', lambda progress: FakeSession('a', progress))
+        while not saving.is_set():
+            await asyncio.sleep(0.01)
+        discard = asyncio.ensure_future(warmup.discard('s1'))
+        await asyncio.sleep(0.05)
+        release.set()
+        await discard
+        assert backend.records == {}
+        assert warmup.store.get('s1') is None
+
+    asyncio.run(scenario())
+
+def test_start_after_finished_build_does_not_raise():
+    async def scenario():
+        warmup = worker(MemoryBackend())
+        progress = warmup.start('s1', lambda progress: FakeSession('a', progress))
+        await progress.task
+        # A tarefa terminou, mas o callback que a remove do SingleFlight pode ainda não ter rodado
+        warmup._flight._calls['s1'] = progress.task
+        again = warmup.start('s1', lambda progress: FakeSession('b', progress))
+        await again.task
+        assert again.status == 'ready'
+        assert 's1' not in warmup._builds
+
+    asyncio.run(scenario())
+
+def test_other_worker_sees_pending_build():
+    backend = MemoryBackend()
+    release = threading.Event()
+
+    def slow_factory(progress):
+        release.wait(5)
+        return FakeSession('a', progress)
+
+    async def scenario():
+        worker_a, worker_b = worker(backend), worker(backend)
+        await worker_a.create('s1', slow_factory)
+
+        assert (await worker_b.status('s1'))['status'] == 'pending'
+        with pytest.raises(SessionNotReady):
+            await worker_b.get('s1')
+
+        release.set()
+        await worker_a.get('s1')
+        assert await worker_b.status('s1') == {'status': 'stored'}
+        assert (await worker_b.get('s1')).name == 'a'
+
+    asyncio.run(scenario())
+
+def test_failed_build_clears_pending_marker_for_other_workers():
+    backend = MemoryBackend()
+
+    async def scenario():
+        worker_a, worker_b = worker(backend), worker(backend)
+        await worker_a.create('s1', failing_factory)
+        with pytest.raises(RuntimeError):
+            await worker_a.get('s1')
+        assert await worker_b.status('s1') is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+from datetime import date
+from services.structured_index import RecordTable, StructuredIndex
+
+TASKS = [
+    {'id': 1, 'title': "A", 'status': "Em andamento", 'priority': "alta", 'project_id': 1, 'due_date': "2024-01-10"},
+    {'id': 2, 'title': "B", 'status': "em andamento", 'priority': "alta", 'project_id': 1, 'due_date': "2024-03-10"},
+    {'id': 3, 'title': "C", 'status': "Concluída", 'priority': "baixa", 'project_id': 2, 'due_date': "2024-01-05"},
+    {'id': 4, 'title': "D", 'status': None, 'priority': "alta", 'project_id': 2},
+]
+
+def test_count_by_groups_by_normalized_value_with_and_without_rows():
+    table = RecordTable(TASKS)
+    expected = {"Em andamento": 2, "Concluída": 1, None: 1}
+    assert dict(table.count_by('status')) == expected
+    assert dict(table.count_by('status', set(range(len(TASKS))))) == expected
+
+    high = table.rows_where('priority', ['alta'])
+    assert dict(table.count_by('status', high)) == {"Em andamento": 2, None: 1}
+
+def test_facts_group_counts_with_filter():
+    index = StructuredIndex([{'id': 1, 'name': "Site"}, {'id': 2, 'name': "App"}], TASKS)
+    facts = index.facts("quantas tarefas com prioridade alta por status?", today=date(2024, 2, 1))
+    assert '- Tarefas com prioridade "alta": 3' in facts
+    assert "Em andamento: 2" in facts and "em andamento" not in facts.replace("Em andamento", "")
+
+def test_overdue_ignores_closed_items():
+    index = StructuredIndex([], TASKS)
+    facts = index.facts("quais tarefas estão atrasadas?", today=date(2024, 2, 1))
+    assert "#1 A" in facts and "#3 C" not in facts and "#2 B" not in facts
+
+def test_later_status_is_not_overdue():
+    tasks = TASKS + [{'id': 5, 'title': "E", 'status': "Later", 'priority': "baixa", 'project_id': 2, 'due_date': "2024-03-01"}]
+    index = StructuredIndex([], tasks)
+    facts = index.facts("quantas tarefas com status later?", today=date(2024, 2, 1))
+    assert '- Tarefas com status "Later": 1' in facts
+    assert "em atraso" not in facts
+
+    facts = index.facts("how many tarefas are late?", today=date(2024, 2, 1))
+    assert "em atraso" in facts
@@ -0,0 +1,46 @@
+import threading
+import numpy as np
+from langchain.schema import Document
+from services.vector_store import NumpyVectorIndex
+
+def test_search_during_deletes_pairs_scores_with_documents():
+    dimensions = 64
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    documents = [Document(page_content=str(i), metadata={'project_id': i % 10}) for i in range(len(vectors))]
+    index = NumpyVectorIndex(embedding=None)
+    index.add_vectors(vectors, documents, ids=[str(i) for i in range(len(vectors))])
+
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            row = int(rng.integers(len(vectors)))
+            for results in index.batch_similarity_search_with_score_by_vectors([vectors[row]], k=3):
+                for doc, score in results:
+                    expected = float(vectors[int(doc.page_content)] @ vectors[row])
+                    if abs(expected - score) > 1e-4:
+                        errors.append((doc.page_content, score, expected))
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for start in range(0, 1500, 10):
+        index.delete([str(i) for i in range(start, start + 10)])
+        index.add_vectors(vectors[start:start + 5], documents[start:start + 5], ids=[str(i) for i in range(start, start + 5)])
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+
+def test_filtered_search_only_returns_matching_rows():
+    vectors = np.eye(8, dtype=np.float32)
+    documents = [Document(page_content=str(i), metadata={'project_id': i % 2}) for i in range(8)]
+    index = NumpyVectorIndex(embedding=None)
+    index.add_vectors(vectors, documents)
+
+    results = index.similarity_search_with_score_by_vector(vectors[3].tolist(), k=8, filter={'project_id': 0})
+    assert sorted(int(doc.page_content) for doc, _ in results) == [0, 2, 4, 6]